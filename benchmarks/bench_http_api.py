@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+HTTP 控制接口压测
+通过 httpx.ASGITransport 在进程内直接调用 FastAPI 应用，Telethon 客户端替换为进程内的假客户端，
+覆盖批量启动、持续轮询 /status 与 /config/check、监控频繁启停（churn）等场景，
+报告各接口的 p50/p99 延迟、吞吐量和事件循环延迟
+
+使用方法: python benchmarks/bench_http_api.py [--monitors 2000] [--concurrency 50] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# 服务在导入时读取配置并创建 sessions 目录：切换到临时目录，使用环境变量提供的假配置，
+# 避免读取或改写仓库中的配置文件、会话文件和监控检查点
+os.chdir(tempfile.mkdtemp(prefix="telemon-bench-"))
+for name, value in {
+    'TELEGRAM_API_ID': '12345',
+    'TELEGRAM_API_HASH': 'bench',
+    'TELEGRAM_PHONE': '+10000000000',
+    'TELEGRAM_BOT_TOKEN': '12345:bench',
+    'TELEGRAM_CHAT_IDS': '-1001',
+    'LOG_LEVEL': 'WARNING',
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+
+VOCABULARY = [f"关键词{i}" for i in range(500)] + [f"keyword_{i}" for i in range(500)]
+LAG_SAMPLE_INTERVAL = 0.01  # 事件循环延迟采样间隔（秒）
+
+
+class FakeTelegramClient:
+    """进程内的假 Telethon 客户端：立即连接，不产生任何网络流量"""
+
+    def __init__(self, session, api_id, api_hash, **kwargs):
+        self._connected = False
+        self._disconnected = asyncio.Event()
+
+    async def connect(self):
+        await asyncio.sleep(0)
+        self._connected = True
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def get_entity(self, channel: str):
+        return SimpleNamespace(id=abs(hash(channel)) % 10 ** 9, title=f"频道 {channel}", username=channel.lstrip('@'))
+
+    def on(self, event):
+        def decorator(handler):
+            return handler
+        return decorator
+
+    async def run_until_disconnected(self):
+        await self._disconnected.wait()
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def disconnect(self):
+        self._connected = False
+        self._disconnected.set()
+
+
+async def _noop():
+    pass
+
+
+class Recorder:
+    """按接口记录每个请求的延迟"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        # 进程内传输不经过套接字，请求之间不会让出事件循环；这里模拟真实连接的 I/O 切换，
+        # 否则单个调用方会独占事件循环，其他调用方和延迟采样都无法运行
+        await asyncio.sleep(0)
+        return response
+
+
+class LoopLagMonitor:
+    """定期 sleep 并测量实际唤醒时间与预期的偏差"""
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected) * 1000)
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(scenario: str, recorder: Recorder, elapsed: float, lag: LoopLagMonitor):
+    total = sum(len(values) for values in recorder.latencies.values())
+    print(f"\n== {scenario}：{total} 个请求，{elapsed:.2f} 秒，吞吐 {total / elapsed:.0f} 请求/秒")
+    print(f"{'接口':<22} {'请求数':>8} {'错误':>6} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+    for name, values in sorted(recorder.latencies.items()):
+        print(f"{name:<22} {len(values):>8} {recorder.errors[name]:>6} "
+              f"{percentile(values, 50):>10.2f} {percentile(values, 99):>10.2f} {max(values):>10.2f}")
+    print(f"事件循环延迟: p50 {percentile(lag.samples, 50):.2f} ms, "
+          f"p99 {percentile(lag.samples, 99):.2f} ms, max {max(lag.samples, default=0.0):.2f} ms")
+
+
+async def run_scenario(name: str, lag: LoopLagMonitor, body):
+    recorder = Recorder()
+    lag.start()
+    start = time.perf_counter()
+    await body(recorder)
+    elapsed = time.perf_counter() - start
+    await lag.stop()
+    report(name, recorder, elapsed, lag)
+
+
+def monitor_payload(rng: random.Random, monitor_id: str) -> dict:
+    return {
+        'id': monitor_id,
+        'channel': f"@bench_channel_{rng.randrange(200)}",
+        'keywords': rng.sample(VOCABULARY, rng.randint(1, 8)),
+        'useRegex': False,
+        'priority': rng.choice(('high', 'normal', 'bulk')),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="HTTP 控制接口压测")
+    parser.add_argument('--monitors', type=int, default=2000, help="批量启动的监控数")
+    parser.add_argument('--concurrency', type=int, default=50, help="并发调用方数量")
+    parser.add_argument('--duration', type=float, default=10.0, help="轮询和 churn 场景的持续时间（秒）")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    server.TelegramClient = FakeTelegramClient
+    server.report_startup_connectivity = _noop  # 不在压测中探测真实网络
+    rng = random.Random(args.seed)
+    lag = LoopLagMonitor()
+    monitor_ids = [f"bench_{i}" for i in range(args.monitors)]
+
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+            async def mass_start(recorder: Recorder):
+                queue = list(monitor_ids)
+
+                async def caller():
+                    while queue:
+                        monitor_id = queue.pop()
+                        await recorder.call(client, "POST /monitor/start", "POST", "/monitor/start",
+                                            json=monitor_payload(rng, monitor_id))
+
+                await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+
+            async def polling(recorder: Recorder):
+                deadline = time.perf_counter() + args.duration
+
+                async def caller():
+                    while time.perf_counter() < deadline:
+                        if rng.random() < 0.9:
+                            await recorder.call(client, "GET /status", "GET", "/status")
+                        else:
+                            await recorder.call(client, "GET /config/check", "GET", "/config/check")
+
+                await asyncio.gather(*(caller() for _ in range(args.concurrency)))
+
+            async def churn(recorder: Recorder):
+                deadline = time.perf_counter() + args.duration
+                # 每个调用方只操作自己的一组监控，避免同一监控被并发启停
+                groups = [monitor_ids[i::args.concurrency] for i in range(args.concurrency)]
+
+                async def caller(group: List[str]):
+                    if not group:
+                        return
+                    while time.perf_counter() < deadline:
+                        monitor_id = rng.choice(group)
+                        action = rng.random()
+                        if action < 0.25:
+                            await recorder.call(client, "POST /monitor/stop", "POST", "/monitor/stop",
+                                                json={'id': monitor_id})
+                            await recorder.call(client, "POST /monitor/resume", "POST", "/monitor/resume",
+                                                json={'id': monitor_id})
+                        elif action < 0.5:
+                            await recorder.call(client, "PATCH /monitor/{id}", "PATCH", f"/monitor/{monitor_id}",
+                                                json={'keywords': rng.sample(VOCABULARY, rng.randint(1, 8))})
+                        elif action < 0.6:
+                            await recorder.call(client, "POST /monitor/delete", "POST", "/monitor/delete",
+                                                json={'id': monitor_id})
+                            await recorder.call(client, "POST /monitor/start", "POST", "/monitor/start",
+                                                json=monitor_payload(rng, monitor_id))
+                        else:
+                            await recorder.call(client, "GET /status", "GET", "/status")
+
+                await asyncio.gather(*(caller(group) for group in groups))
+
+            await run_scenario(f"批量启动 {args.monitors} 个监控", lag, mass_start)
+            await run_scenario(f"轮询 /status 与 /config/check（{args.monitors} 个监控）", lag, polling)
+            await run_scenario("监控启停 churn（混合 /status 轮询）", lag, churn)
+
+        shutdown_start = time.perf_counter()
+    print(f"\n优雅关闭耗时: {time.perf_counter() - shutdown_start:.2f} 秒")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+关键词预过滤基准测试
+对比启用预过滤与直接完整匹配的每条消息耗时，并报告预过滤的假阳性率；
+计时前先检查预过滤不会漏掉完整匹配能命中的消息（发现漏报时以非零状态退出）
+
+使用方法: python benchmarks/bench_prefilter.py [--messages 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re  # noqa: E402
+
+from matcher import KeywordMatcher, Prefilter, _required_literals, sre_parse  # noqa: E402
+
+MATCH_RATIO = 0.05  # 混入关键词（可能命中）的消息比例
+
+WORDS = (
+    "今天 市场 行情 价格 上涨 下跌 公告 新闻 项目 社区 活动 空投 交易所 上线 钱包 用户 "
+    "the market price update news project community event wallet exchange listing token "
+    "today breaking report analysis trading volume support resistance chart weekly"
+).split()
+
+
+VOCABULARY = [f"代币{i}" for i in range(200)] + [f"coin{i}" for i in range(200)]
+
+
+def make_messages(count: int, rng: random.Random):
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 120))]
+        if rng.random() < MATCH_RATIO:
+            words.insert(rng.randrange(len(words)), rng.choice(VOCABULARY))
+        yield ' '.join(words)
+
+
+# (正则, 应能匹配的文本)：覆盖忽略大小写时的特殊等价字符、分支、分组和重复
+LITERAL_CASES = [
+    ('bitcoin', 'BıTCOıN news'),
+    ('bitcoin', 'BİTCOİN news'),
+    ('BITCOIN', 'bıtcoın'),
+    ('straße', 'STRASSE'),
+    ('strasse', 'STRAẞE'),
+    ('kelvin', 'KELVIN'),
+    ('σοφία', 'ΣΟΦΊΑ'),
+    (r'\b(Bitcoin|BTC)\b', 'btc 突破'),
+    (r'(?:air)+drop', 'AIRAIRDROP'),
+    (r'空投\d+', '本周空投 3 次，空投12'),
+    (r'[一-龥]{2,4}股', '科技股'),
+]
+
+
+def make_keyword_sets(rng: random.Random):
+    return {
+        '普通 5 个': (rng.sample(VOCABULARY, 5), False),
+        '普通 20 个': (rng.sample(VOCABULARY, 20), False),
+        '普通 100 个': (rng.sample(VOCABULARY, 100), False),
+        '正则 5 个': ([r'\b(Bitcoin|BTC)\b', r'\$\d+', r'[一-龥]{2,4}股', r'\d{4}-\d{2}-\d{2}', r'空投\d+'], True),
+        '正则 5 个（长字面量）': ([r'\b(Bitcoin|BTC)\b', r'coin1\d\b', r'代币\d+', r'空投\d+', r'合约地址[:：]\s*\w+'], True),
+    }
+
+
+def check_required_literals() -> int:
+    """对每个用例，re.search 能匹配的文本必须能通过由提取出的字面量构建的预过滤"""
+    failures = 0
+    for pattern, text in LITERAL_CASES:
+        if not re.search(pattern, text, re.IGNORECASE):
+            continue
+        literals = _required_literals(sre_parse.parse(pattern))
+        if literals and not Prefilter(literals).may_match(text):
+            failures += 1
+            print(f"字面量漏报: {pattern!r} 提取 {literals}，无法覆盖 {text!r}")
+        if KeywordMatcher([pattern], True).match(text) is None:
+            failures += 1
+            print(f"匹配器漏报: {pattern!r} 未匹配 {text!r}")
+    return failures
+
+
+def count_missed(matcher: KeywordMatcher, messages) -> int:
+    """完整匹配能命中但被预过滤拒绝的消息数"""
+    if matcher.prefilter is None:
+        return 0
+    return sum(
+        1 for message in messages
+        if matcher._match_full(message) is not None and not matcher.prefilter.may_match(message)
+    )
+
+
+def bench(matcher: KeywordMatcher, messages, use_prefilter: bool) -> float:
+    match = matcher.match if use_prefilter else matcher._match_full
+    start = time.perf_counter()
+    for message in messages:
+        match(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词预过滤基准测试")
+    parser.add_argument('--messages', type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    messages = list(make_messages(args.messages, rng))
+    keyword_sets = make_keyword_sets(rng)
+
+    missed = check_required_literals()
+    for name, (keywords, use_regex) in keyword_sets.items():
+        count = count_missed(KeywordMatcher(keywords, use_regex), messages)
+        if count:
+            print(f"{name}: 预过滤漏报 {count} 条消息")
+        missed += count
+    if missed:
+        sys.exit(1)
+
+    print(f"{'关键词集合':<20} {'完整匹配 (µs/条)':>16} {'预过滤 (µs/条)':>14} {'拒绝率':>8} {'假阳性率':>8}")
+    for name, (keywords, use_regex) in keyword_sets.items():
+        matcher = KeywordMatcher(keywords, use_regex)
+        full = bench(matcher, messages, use_prefilter=False)
+        filtered = bench(matcher, messages, use_prefilter=True)
+        if matcher.prefilter is None:
+            print(f"{name:<20} {full:>16.2f} {'未启用':>14}")
+            continue
+        stats = matcher.prefilter.stats()
+        reject_rate = stats['rejected'] / stats['checked']
+        note = '' if stats['active'] else f"  （拒绝率过低，检查 {stats['checked']} 条后停用）"
+        print(f"{name:<20} {full:>16.2f} {filtered:>14.2f} {reject_rate:>8.1%} {stats['falsePositiveRate']:>8.1%}{note}")
+
+
+if __name__ == '__main__':
+    main()
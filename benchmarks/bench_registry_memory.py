@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+监控注册表内存基准测试
+对比旧的嵌套字典表示（model_dump() 副本 + 状态字典）与 __slots__ Monitor 记录的每个监控占用字节数
+
+使用方法: python benchmarks/bench_registry_memory.py [--sizes 10000 100000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from registry import Monitor, KeywordPool  # noqa: E402
+
+KEYWORD_SET_COUNT = 500   # 不同关键词集合的数量
+CHANNEL_COUNT = 2000      # 不同频道的数量
+VOCABULARY = [f"关键词{i}" for i in range(3000)] + [f"keyword_{i}" for i in range(3000)]
+
+
+def fresh(value: str) -> str:
+    """模拟每个请求从 JSON 解析出的独立字符串对象"""
+    return value.encode('utf-8').decode('utf-8')
+
+
+def build_workload(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    keyword_sets = [rng.sample(VOCABULARY, rng.randint(3, 8)) for _ in range(KEYWORD_SET_COUNT)]
+    channels = [f"@channel_{i}" for i in range(CHANNEL_COUNT)]
+    for i in range(size):
+        yield {
+            'id': f"monitor_{i}",
+            'channel': rng.choice(channels),
+            'keywords': rng.choice(keyword_sets),
+            'useRegex': False,
+            'chatIds': None,
+            'priority': 'normal',
+        }
+
+
+def build_legacy(workload):
+    """旧表示：monitor_configs 中的配置字典副本，以及监控任务持有的第二份副本"""
+    monitor_configs = {}
+    task_configs = []
+    for item in workload:
+        config_dict = {key: (fresh(value) if isinstance(value, str) else value) for key, value in item.items()}
+        config_dict['keywords'] = [fresh(keyword) for keyword in item['keywords']]
+        config_dict['channelTitle'] = fresh(item['channel'][1:])
+        monitor_configs[config_dict['id']] = {'config': config_dict, 'status': 'running'}
+        # start_monitor_endpoint 中第二次 model_dump() 传给监控任务的副本
+        task_config = dict(config_dict)
+        task_config['keywords'] = list(config_dict['keywords'])
+        task_configs.append(task_config)
+    return monitor_configs, task_configs
+
+
+def build_compact(workload):
+    """新表示：__slots__ Monitor 记录，字符串驻留，关键词集合与匹配器共享"""
+    pool = KeywordPool()
+    monitors = {}
+    for item in workload:
+        monitor = Monitor(
+            fresh(item['id']),
+            fresh(item['channel']),
+            [fresh(keyword) for keyword in item['keywords']],
+            item['useRegex'],
+            chat_ids=item['chatIds'],
+            priority=fresh(item['priority']),
+            pool=pool
+        )
+        monitor.channel_title = sys.intern(fresh(item['channel'][1:]))
+        monitors[monitor.id] = monitor
+    return monitors, pool
+
+
+def measure(builder, size: int) -> float:
+    """返回每个监控占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = builder(build_workload(size))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del result
+    gc.collect()
+    return total / size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监控注册表内存基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'监控数量':>10} {'旧表示 (B/监控)':>16} {'新表示 (B/监控)':>16} {'节省':>8}")
+    for size in args.sizes:
+        legacy = measure(build_legacy, size)
+        compact = measure(build_compact, size)
+        print(f"{size:>10} {legacy:>16.0f} {compact:>16.0f} {1 - compact / legacy:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,21 @@
 #!/usr/bin/env python3
 """
 配置管理模块
-支持从 YAML 配置文件和环境变量加载配置
+支持从 YAML 配置文件和环境变量加载配置，并支持运行时热重载
 """
 
 import os
+import logging
 import yaml
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Mapping, Tuple
+from dataclasses import dataclass, field
 
+# 支持的 Telethon 会话后端
+SESSION_BACKENDS = ('sqlite', 'memory')
 
-@dataclass
+
+@dataclass(frozen=True)
 class ProxyConfig:
     """代理配置类"""
     enabled: bool = False
@@ -45,17 +50,13 @@ class ProxyConfig:
         return proxy_config
 
 
-@dataclass
+@dataclass(frozen=True)
 class TelegramConfig:
     """Telegram API 配置类"""
     api_id: str = "your_api_id_here"
     api_hash: str = "your_api_hash_here"
     phone: str = "+8613812345678"
-    proxy: Optional[ProxyConfig] = None
-    
-    def __post_init__(self):
-        if self.proxy is None:
-            self.proxy = ProxyConfig()
+    proxy: ProxyConfig = field(default_factory=ProxyConfig)
     
     def validate(self) -> bool:
         """验证配置是否完整"""
@@ -66,15 +67,15 @@ class TelegramConfig:
         ])
 
 
-@dataclass
+@dataclass(frozen=True)
 class BotConfig:
     """Telegram Bot 配置类"""
     token: str = "your_bot_token_here"
-    chat_ids: Optional[List[str]] = None
+    chat_ids: Tuple[str, ...] = ("your_chat_id_here",)
     
     def __post_init__(self):
-        if self.chat_ids is None:
-            self.chat_ids = ["your_chat_id_here"]
+        # 配置文件中的列表转为元组，快照发布后不可修改
+        object.__setattr__(self, 'chat_ids', tuple(self.chat_ids or ()))
     
     def validate(self) -> bool:
         """验证Bot配置是否完整"""
@@ -97,108 +98,262 @@ class BotConfig:
         return True
 
 
-@dataclass
+@dataclass(frozen=True)
 class ServerConfig:
     """服务器配置类"""
     host: str = "0.0.0.0"
     port: int = 8080
     session_dir: str = "sessions"
+    session_backend: str = "sqlite"     # Telethon 会话后端: "sqlite"（默认会话文件）或 "memory"
+    session_flush_interval: float = 30.0  # 内存会话快照写入磁盘的间隔（秒）
+    profiling: bool = False             # 是否开启性能分析（/admin/metrics、/admin/profile）
+    
+    def validate(self) -> bool:
+        """验证服务器配置是否有效"""
+        return self.session_backend in SESSION_BACKENDS
+
+
+@dataclass(frozen=True)
+class LoggingConfig:
+    """日志配置类"""
+    level: str = "INFO"
+    format: str = "json"  # "json" 或 "text"
+    # 各子系统的日志级别，如 {'monitor': 'WARNING'}
+    levels: Mapping[str, str] = field(default_factory=dict)
+    # 热路径重复日志采样：每个时间窗口内同类日志最多输出的条数
+    sample_interval: float = 10.0
+    sample_burst: int = 5
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'levels', MappingProxyType(dict(self.levels)))
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    不可变配置快照
+
+    每次加载都会构建全新的配置对象并整体发布；快照及其包含的各配置段都是不可变的，
+    热路径只需读取一次 `config.snapshot` 即可获得一致的配置视图，无需加锁。
+    """
+    telegram: TelegramConfig
+    bot: BotConfig
+    server: ServerConfig
+    logging: LoggingConfig = field(default_factory=LoggingConfig)
+    telegram_valid: bool = False
+    bot_valid: bool = False
+    server_valid: bool = False
+    # 配置文件的修改时间，用于检测文件变更
+    mtime_ns: Optional[int] = field(default=None, compare=False)
+
 
 class AppConfig:
     """应用程序主配置类"""
     
     def __init__(self, config_file: str = "app_config.yaml"):
         self.config_file = config_file
-        self.telegram = TelegramConfig()
-        self.bot = BotConfig()
-        self.server = ServerConfig()
+        # 最近一次重载失败时的文件修改时间，避免对同一份错误文件反复重试
+        self._failed_mtime_ns: Optional[int] = None
         
         # 加载配置
-        self._load_config()
+        self._snapshot = self._load_config()
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """获取当前配置快照"""
+        return self._snapshot
+    
+    @property
+    def telegram(self) -> TelegramConfig:
+        return self._snapshot.telegram
+    
+    @property
+    def bot(self) -> BotConfig:
+        return self._snapshot.bot
+    
+    @property
+    def server(self) -> ServerConfig:
+        return self._snapshot.server
+    
+    @property
+    def logging(self) -> LoggingConfig:
+        return self._snapshot.logging
     
-    def _load_config(self):
-        """加载配置文件和环境变量"""
+    def _get_mtime_ns(self) -> Optional[int]:
+        """获取配置文件的修改时间，文件不存在时返回 None"""
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load_config(self, strict: bool = False) -> ConfigSnapshot:
+        """加载配置文件和环境变量，构建新的配置快照
+        
+        各配置段先收集为字段字典，全部加载完成后再构建不可变的配置对象
+        
+        Args:
+            strict: 为 True 时配置文件加载失败直接抛出异常（用于热重载）
+        """
+        values: Dict[str, Dict[str, Any]] = {
+            'telegram': {}, 'proxy': {}, 'bot': {}, 'server': {}, 'logging': {}
+        }
+        mtime_ns = self._get_mtime_ns()
+        
         # 1. 首先从配置文件加载
         if os.path.exists(self.config_file):
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     config_data = yaml.safe_load(f) or {}
-                    self._apply_config_data(config_data)
+                    self._apply_config_data(config_data, values)
             except Exception as e:
-                print(f"警告: 配置文件加载失败: {e}")
+                if strict:
+                    raise
+                logging.getLogger("telemon.config").warning(f"警告: 配置文件加载失败: {e}")
         
         # 2. 然后从环境变量覆盖
-        self._load_from_env()
+        self._load_from_env(values)
+        
+        telegram = TelegramConfig(proxy=ProxyConfig(**values['proxy']), **values['telegram'])
+        bot = BotConfig(**values['bot'])
+        server = ServerConfig(**values['server'])
+        return ConfigSnapshot(
+            telegram=telegram,
+            bot=bot,
+            server=server,
+            logging=LoggingConfig(**values['logging']),
+            telegram_valid=telegram.validate(),
+            bot_valid=bot.validate(),
+            server_valid=server.validate(),
+            mtime_ns=mtime_ns
+        )
+    
+    def file_changed(self) -> bool:
+        """检查配置文件自上次加载（或上次重载失败）后是否被修改"""
+        mtime_ns = self._get_mtime_ns()
+        return mtime_ns != self._snapshot.mtime_ns and mtime_ns != self._failed_mtime_ns
+    
+    def reload(self) -> tuple[bool, List[str], List[str]]:
+        """重新加载配置文件，校验通过后原子替换当前快照
+        
+        Returns:
+            tuple: (是否成功, 发生变更的配置段列表, 错误消息列表)
+        """
+        try:
+            new_snapshot = self._load_config(strict=True)
+        except Exception as e:
+            self._failed_mtime_ns = self._get_mtime_ns()
+            return False, [], [f"配置文件加载失败: {e}"]
+        
+        errors = self._snapshot_errors(new_snapshot)
+        if errors:
+            self._failed_mtime_ns = new_snapshot.mtime_ns
+            return False, [], errors
+        
+        old_snapshot = self._snapshot
+        changed = []
+        old_telegram, new_telegram = old_snapshot.telegram, new_snapshot.telegram
+        if (old_telegram.api_id, old_telegram.api_hash, old_telegram.phone) != \
+                (new_telegram.api_id, new_telegram.api_hash, new_telegram.phone):
+            changed.append('telegram')
+        if old_telegram.proxy != new_telegram.proxy:
+            changed.append('proxy')
+        if old_snapshot.bot != new_snapshot.bot:
+            changed.append('bot')
+        if old_snapshot.server != new_snapshot.server:
+            changed.append('server')
+        if old_snapshot.logging != new_snapshot.logging:
+            changed.append('logging')
+        
+        # 单次引用赋值即完成发布，读取方要么看到旧快照，要么看到新快照
+        self._snapshot = new_snapshot
+        return True, changed, []
     
-    def _apply_config_data(self, config_data: Dict[str, Any]):
-        """应用配置数据"""
+    def _apply_config_data(self, config_data: Dict[str, Any], values: Dict[str, Dict[str, Any]]):
+        """应用配置数据（写入各配置段的字段字典）"""
         # Telegram 配置
         if 'telegram' in config_data:
             telegram_data = config_data['telegram']
-            self.telegram.api_id = telegram_data.get('api_id', self.telegram.api_id)
-            self.telegram.api_hash = telegram_data.get('api_hash', self.telegram.api_hash)
-            self.telegram.phone = telegram_data.get('phone', self.telegram.phone)
+            for key in ('api_id', 'api_hash', 'phone'):
+                if key in telegram_data:
+                    values['telegram'][key] = telegram_data[key]
         
         # 代理配置
         if 'proxy' in config_data:
-            if self.telegram.proxy is None:
-                self.telegram.proxy = ProxyConfig()
             proxy_data = config_data['proxy']
-            self.telegram.proxy.enabled = proxy_data.get('enabled', False)
-            self.telegram.proxy.type = proxy_data.get('type', 'socks5')
-            self.telegram.proxy.host = proxy_data.get('host', '127.0.0.1')
-            self.telegram.proxy.port = proxy_data.get('port', 7890)
-            self.telegram.proxy.username = proxy_data.get('username')
-            self.telegram.proxy.password = proxy_data.get('password')
+            values['proxy'].update(
+                enabled=proxy_data.get('enabled', False),
+                type=proxy_data.get('type', 'socks5'),
+                host=proxy_data.get('host', '127.0.0.1'),
+                port=proxy_data.get('port', 7890),
+                username=proxy_data.get('username'),
+                password=proxy_data.get('password')
+            )
         
         # Bot 配置
         if 'bot' in config_data:
             bot_data = config_data['bot']
-            self.bot.token = bot_data.get('token', self.bot.token)
-            self.bot.chat_ids = bot_data.get('chat_ids', self.bot.chat_ids)
+            for key in ('token', 'chat_ids'):
+                if key in bot_data:
+                    values['bot'][key] = bot_data[key]
         
         # 服务器配置
         if 'server' in config_data:
             server_data = config_data['server']
-            self.server.host = server_data.get('host', self.server.host)
-            self.server.port = server_data.get('port', self.server.port)
-            self.server.session_dir = server_data.get('session_dir', self.server.session_dir)
+            server = values['server']
+            for key in ('host', 'port', 'session_dir', 'session_backend'):
+                if key in server_data:
+                    server[key] = server_data[key]
+            if 'session_flush_interval' in server_data:
+                server['session_flush_interval'] = float(server_data['session_flush_interval'])
+            if 'profiling' in server_data:
+                server['profiling'] = bool(server_data['profiling'])
+        
+        # 日志配置
+        if 'logging' in config_data:
+            logging_data = config_data['logging'] or {}
+            logging_values = values['logging']
+            for key in ('level', 'format'):
+                if key in logging_data:
+                    logging_values[key] = logging_data[key]
+            logging_values['levels'] = dict(logging_data.get('levels') or {})
+            if 'sample_interval' in logging_data:
+                logging_values['sample_interval'] = float(logging_data['sample_interval'])
+            if 'sample_burst' in logging_data:
+                logging_values['sample_burst'] = int(logging_data['sample_burst'])
     
-    def _load_from_env(self):
-        """从环境变量加载配置"""
+    def _load_from_env(self, values: Dict[str, Dict[str, Any]]):
+        """从环境变量加载配置（写入各配置段的字段字典）"""
         # Telegram 配置
-        self.telegram.api_id = os.getenv('TELEGRAM_API_ID', self.telegram.api_id)
-        self.telegram.api_hash = os.getenv('TELEGRAM_API_HASH', self.telegram.api_hash)
-        self.telegram.phone = os.getenv('TELEGRAM_PHONE', self.telegram.phone)
+        for key, env in (('api_id', 'TELEGRAM_API_ID'), ('api_hash', 'TELEGRAM_API_HASH'), ('phone', 'TELEGRAM_PHONE')):
+            if env in os.environ:
+                values['telegram'][key] = os.environ[env]
         
         # 代理配置
-        if self.telegram.proxy is None:
-            self.telegram.proxy = ProxyConfig()
+        proxy = values['proxy']
         if os.getenv('PROXY_ENABLED'):
-            self.telegram.proxy.enabled = os.getenv('PROXY_ENABLED', '').lower() in ['true', '1', 'yes']
+            proxy['enabled'] = os.getenv('PROXY_ENABLED', '').lower() in ['true', '1', 'yes']
         if os.getenv('PROXY_TYPE'):
-            proxy_type = os.getenv('PROXY_TYPE')
-            if proxy_type:
-                self.telegram.proxy.type = proxy_type
+            proxy['type'] = os.getenv('PROXY_TYPE')
         if os.getenv('PROXY_HOST'):
-            proxy_host = os.getenv('PROXY_HOST')
-            if proxy_host:
-                self.telegram.proxy.host = proxy_host
+            proxy['host'] = os.getenv('PROXY_HOST')
         if os.getenv('PROXY_PORT'):
-            proxy_port = os.getenv('PROXY_PORT')
-            if proxy_port:
-                self.telegram.proxy.port = int(proxy_port)
+            proxy['port'] = int(os.getenv('PROXY_PORT'))
         if os.getenv('PROXY_USERNAME'):
-            self.telegram.proxy.username = os.getenv('PROXY_USERNAME')
+            proxy['username'] = os.getenv('PROXY_USERNAME')
         if os.getenv('PROXY_PASSWORD'):
-            self.telegram.proxy.password = os.getenv('PROXY_PASSWORD')
+            proxy['password'] = os.getenv('PROXY_PASSWORD')
         
         # Bot 配置
-        self.bot.token = os.getenv('TELEGRAM_BOT_TOKEN', self.bot.token)
+        if 'TELEGRAM_BOT_TOKEN' in os.environ:
+            values['bot']['token'] = os.environ['TELEGRAM_BOT_TOKEN']
         if os.getenv('TELEGRAM_CHAT_IDS'):
             chat_ids_str = os.getenv('TELEGRAM_CHAT_IDS')
-            if chat_ids_str:
-                self.bot.chat_ids = [id.strip() for id in chat_ids_str.split(',') if id.strip()]
+            values['bot']['chat_ids'] = [id.strip() for id in chat_ids_str.split(',') if id.strip()]
+        
+        # 日志配置
+        for key, env in (('level', 'LOG_LEVEL'), ('format', 'LOG_FORMAT')):
+            if env in os.environ:
+                values['logging'][key] = os.environ[env]
     
     def validate(self) -> tuple[bool, List[str]]:
         """验证所有配置
@@ -206,24 +361,33 @@ class AppConfig:
         Returns:
             tuple: (是否有效, 错误消息列表)
         """
+        errors = self._snapshot_errors(self._snapshot)
+        return len(errors) == 0, errors
+    
+    @staticmethod
+    def _snapshot_errors(snapshot: ConfigSnapshot) -> List[str]:
+        """启动和热重载共用的配置校验"""
         errors = []
         
-        if not self.telegram.validate():
+        if not snapshot.telegram_valid:
             errors.append("Telegram API 配置不完整：请检查 API ID、API Hash 和手机号")
         
-        if not self.bot.validate():
+        if not snapshot.bot_valid:
             errors.append("Bot 配置不完整：请检查 Bot Token 和 Chat IDs")
         
-        return len(errors) == 0, errors
+        if not snapshot.server_valid:
+            errors.append(f"不支持的会话后端: {snapshot.server.session_backend}（可选 {' / '.join(SESSION_BACKENDS)}）")
+        
+        return errors
     
     def validate_bot(self) -> bool:
         """验证Bot配置"""
-        return self.bot.validate()
+        return self._snapshot.bot_valid
     
     @property
     def chat_ids(self) -> List[str]:
         """获取 Chat IDs"""
-        return self.bot.chat_ids or []
+        return list(self.bot.chat_ids)
     
     @property 
     def bot_token(self) -> str:
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+日志模块
+结构化（JSON）日志通过队列交给后台线程输出，写入慢速管道或 journald 时不会阻塞事件循环；
+热路径上的重复日志支持按 key 限速采样
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+ROOT_LOGGER = "telemon"
+
+# 子系统名称，对应 logging.levels 中的配置项
+SUBSYSTEMS = ("server", "monitor", "notify", "config", "connectivity", "matcher", "session")
+
+# 会被输出到结构化日志中的附加字段
+EXTRA_FIELDS = ("monitor_id", "channel", "chat_id", "latency_ms", "suppressed")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_sampling_filter: Optional["SamplingFilter"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'subsystem': record.name.rsplit('.', 1)[-1],
+            'msg': record.getMessage(),
+        }
+        for name in EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """便于在终端阅读的文本格式，保持 `[monitor_id] 消息` 的输出风格"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        monitor_id = getattr(record, 'monitor_id', None)
+        if monitor_id is not None:
+            message = f"[{monitor_id}] {message}"
+        suppressed = getattr(record, 'suppressed', None)
+        if suppressed:
+            message += f"（已省略 {suppressed} 条相同日志）"
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return message
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    保留异常信息的队列处理器
+
+    标准 QueueHandler 在入队前把异常堆栈格式化进 msg 并清空 exc_info，
+    这里只合并消息参数，exc_info 原样入队，堆栈由后台线程按输出格式处理
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按 sample_key 限速采样的过滤器
+
+    带有 `sample_key` 的日志在每个时间窗口内最多输出 burst 条，超出部分只计数；
+    下个窗口的第一条日志通过 `suppressed` 字段报告上个窗口省略的条数。
+    未设置 `sample_key` 的日志不受影响。
+    """
+
+    def __init__(self, interval: float = 10.0, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # { sample_key: [窗口开始时间, 已输出条数, 已省略条数] }
+        self._windows: Dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'sample_key', None)
+        if key is None:
+            return True
+
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [now, 1, 0]
+            return True
+
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """获取子系统日志记录器"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def apply_levels(level: str = "INFO", levels: Optional[Dict[str, str]] = None):
+    """设置全局及各子系统的日志级别（可在配置热重载时调用）"""
+    logging.getLogger(ROOT_LOGGER).setLevel(level.upper())
+    for subsystem in SUBSYSTEMS:
+        logger = get_logger(subsystem)
+        subsystem_level = (levels or {}).get(subsystem)
+        logger.setLevel(subsystem_level.upper() if subsystem_level else logging.NOTSET)
+
+
+def _make_formatter(fmt: str) -> logging.Formatter:
+    return TextFormatter() if fmt == "text" else JsonFormatter()
+
+
+def setup_logging(level: str = "INFO", levels: Optional[Dict[str, str]] = None, fmt: str = "json",
+                  sample_interval: float = 10.0, sample_burst: int = 5):
+    """
+    初始化日志管道：调用方只负责把日志放入内存队列，格式化和写出由后台线程完成
+
+    Args:
+        level: 全局日志级别
+        levels: 各子系统的日志级别，如 {'monitor': 'WARNING'}
+        fmt: 输出格式，'json' 或 'text'
+        sample_interval: 采样时间窗口（秒）
+        sample_burst: 每个时间窗口内同一 sample_key 最多输出的条数
+    """
+    global _listener, _sampling_filter
+
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        # 重复初始化（配置热重载）时更新级别、采样参数和输出格式
+        apply_levels(level, levels)
+        _sampling_filter.interval = sample_interval
+        _sampling_filter.burst = sample_burst
+        for handler in _listener.handlers:
+            handler.setFormatter(_make_formatter(fmt))
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    # 采样在调用方线程完成，被省略的日志不会进入队列
+    _sampling_filter = SamplingFilter(sample_interval, sample_burst)
+    queue_handler.addFilter(_sampling_filter)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(_make_formatter(fmt))
+
+    root.handlers = [queue_handler]
+    root.propagate = False
+    apply_levels(level, levels)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台线程并输出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+消息匹配缓存模块
+频道重复发布、转发同一公告或编辑后的消息文本往往与之前完全相同，
+按 (匹配器版本, 文本摘要) 缓存匹配结果和渲染好的预览，重复消息只需一次哈希查询
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional
+
+from matcher import KeywordMatcher
+
+MATCH_CACHE_SIZE = 4096  # 全局匹配缓存的最大条目数
+EDIT_TRACK_SIZE = 1000   # 每个监控记录已匹配关键词的最近消息数（用于编辑消息的差异匹配）
+
+
+class LRUCache:
+    """有容量上限的 LRU 缓存，超出容量时淘汰最久未使用的条目"""
+
+    __slots__ = ('maxsize', '_data', 'hits', 'misses')
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxSize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedMatch:
+    """一条消息文本在某个匹配器下的匹配结果"""
+
+    __slots__ = ('keyword', 'keywords', 'preview')
+
+    def __init__(self, keyword: Optional[str]):
+        self.keyword = keyword                        # 第一个匹配的关键词，未匹配为 None
+        self.keywords: Optional[FrozenSet[str]] = None  # 所有匹配的关键词，按需计算
+        self.preview: Optional[str] = None            # 渲染好的通知预览，首次发送通知时生成
+
+
+def text_digest(message_text: str) -> bytes:
+    """消息文本摘要，避免缓存中保存完整文本"""
+    return hashlib.blake2b(message_text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class MatchCache(LRUCache):
+    """
+    全局匹配缓存
+
+    键中的匹配器版本在关键词集合变化时随新匹配器一起变化，旧结果无需主动失效，
+    会自然被淘汰；关键词集合相同的监控共享匹配器，因此也共享缓存结果。
+    """
+
+    __slots__ = ()
+
+    def lookup(self, matcher: KeywordMatcher, message_text: str) -> CachedMatch:
+        """获取消息的匹配结果，未命中时执行匹配并写入缓存"""
+        key = (matcher.version, text_digest(message_text))
+        entry = self.get(key)
+        if entry is None:
+            entry = CachedMatch(matcher.match(message_text))
+            self.put(key, entry)
+        return entry
+
+    def lookup_all(self, matcher: KeywordMatcher, message_text: str) -> CachedMatch:
+        """获取消息的匹配结果，并确保已计算所有匹配的关键词"""
+        entry = self.lookup(matcher, message_text)
+        if entry.keywords is None:
+            if entry.keyword is None:
+                entry.keywords = frozenset()
+            else:
+                entry.keywords = matcher.match_all(message_text)
+        return entry
+
+
+# 全局共享的匹配缓存
+match_cache = MatchCache(MATCH_CACHE_SIZE)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+关键词匹配模块
+将监控任务的关键词列表预编译为匹配器，供消息处理热路径使用；
+匹配器附带基于必需字面量的预过滤器，大部分不可能匹配的消息无需执行完整匹配
+"""
+
+import itertools
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+from logger import get_logger
+
+log = get_logger("matcher")
+
+# 关键词列表为空时返回的匹配标签
+MATCH_ALL_LABEL = "全部消息"
+
+# 有效关键词少于该数量且不含正则时，完整匹配本身已足够快，不启用预过滤
+PREFILTER_MIN_KEYWORDS = 16
+
+# 任一关键词只能提取到短于该长度的字面量（如 `\$\d+` 中的 `$`）时，几乎所有消息都能通过预过滤，
+# 多出的一遍扫描反而拖慢匹配，不启用预过滤
+PREFILTER_MIN_LITERAL_LENGTH = 2
+
+# 预过滤检查过该数量的消息后，拒绝率仍低于阈值时停用（多出的一遍扫描省不下足够多的完整匹配）
+PREFILTER_WARMUP_MESSAGES = 1000
+PREFILTER_MIN_REJECT_RATE = 0.5
+
+# 忽略大小写的正则中 i/I 与土耳其语的 ı/İ 互相等价，但大小写折叠后 I 变为 i、İ 变为 i + 组合上点（U+0307），
+# ı 保持不变；预过滤正则中的 i 和 ı 因此都按这三种写法匹配，避免漏掉 "BıTCOıN"、"BİTCOİN" 之类的写法
+_TURKISH_I = str.maketrans({'i': '(?:i\u0307?|ı)', 'ı': '(?:i\u0307?|ı)'})
+
+# 匹配器版本号，每个匹配器实例唯一，用作匹配缓存键的一部分
+_versions = itertools.count(1)
+
+_REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name)
+)
+
+
+def _required_literals(parsed) -> Optional[List[str]]:
+    """
+    从解析后的正则中提取必需的字面量因子
+
+    Returns:
+        Optional[List[str]]: 任一匹配必然包含列表中至少一个字面量（已大小写折叠）；
+        无法确定时返回 None
+    """
+    candidates: List[List[str]] = []
+    run: List[str] = []
+
+    def end_run():
+        if run:
+            candidates.append([''.join(run)])
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            folded = chr(av).casefold()
+            # 折叠后长度变化的字符（如 ß）在忽略大小写的正则中可能对应不同写法，不作为字面量
+            if len(folded) == 1:
+                run.append(folded)
+                continue
+
+        end_run()
+        if op is sre_constants.SUBPATTERN:
+            literals = _required_literals(av[-1])
+            if literals:
+                candidates.append(literals)
+        elif op is sre_constants.BRANCH:
+            alternatives: List[str] = []
+            for branch in av[1]:
+                literals = _required_literals(branch)
+                if not literals:
+                    alternatives = []
+                    break
+                alternatives.extend(literals)
+            if alternatives:
+                candidates.append(alternatives)
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            literals = _required_literals(av[2])
+            if literals:
+                candidates.append(literals)
+    end_run()
+
+    if not candidates:
+        return None
+    # 选择最短字面量最长的候选（选择性最好），其次选择备选项更少的
+    return max(candidates, key=lambda literals: (min(map(len, literals)), -len(literals)))
+
+
+class Prefilter:
+    """
+    关键词预过滤器
+
+    从每个关键词中取出匹配时必然出现的字面量（大小写折叠后；正则关键词从解析结果中提取字面量因子），
+    所有字面量合并为一个预编译的多选正则。消息文本折叠后只需在 C 层单遍扫描一次，
+    不再逐个关键词查找；没有任何字面量出现的消息必然无法匹配，直接跳过完整匹配。
+    通过预过滤的消息仍需完整匹配，因此只会产生假阳性，不会漏报。
+    字面量都很短时几乎无法拒绝任何消息，此时不启用预过滤；
+    启用后实际拒绝率过低（字面量在频道消息中很常见）时自动停用。
+    """
+
+    __slots__ = ('_pattern', 'active', 'checked', 'rejected', 'matched')
+
+    def __init__(self, literals: List[str]):
+        self._pattern = re.compile('|'.join(
+            re.escape(literal).translate(_TURKISH_I) for literal in sorted(set(literals))
+        ))
+        self.active = True  # 拒绝率过低时停用，之后的消息直接完整匹配
+        self.checked = 0   # 经过预过滤的消息数
+        self.rejected = 0  # 被预过滤拒绝的消息数
+        self.matched = 0   # 通过预过滤且完整匹配成功的消息数
+
+    @classmethod
+    def build(cls, entries: List[Tuple[str, Optional[re.Pattern], str]]) -> Optional['Prefilter']:
+        """
+        根据匹配器条目构建预过滤器
+
+        任一关键词无法提取字面量（无法拒绝任何消息），或最短字面量不足
+        PREFILTER_MIN_LITERAL_LENGTH（拒绝率太低，得不偿失）时返回 None
+        """
+        literals: List[str] = []
+        for keyword, pattern, _ in entries:
+            if pattern is not None:
+                try:
+                    required = _required_literals(sre_parse.parse(keyword))
+                except Exception:
+                    required = None
+                if not required:
+                    return None
+                literals.extend(required)
+            else:
+                literals.append(keyword.casefold())
+
+        if not literals or min(map(len, literals)) < PREFILTER_MIN_LITERAL_LENGTH:
+            return None
+        return cls(literals)
+
+    def may_match(self, message_text: str) -> bool:
+        """消息是否可能匹配"""
+        return self._pattern.search(message_text.casefold()) is not None
+
+    def check_payoff(self):
+        """消息通过预过滤时调用：检查足够多的消息后拒绝率仍低于阈值则停用"""
+        if self.checked >= PREFILTER_WARMUP_MESSAGES and self.rejected < self.checked * PREFILTER_MIN_REJECT_RATE:
+            self.active = False
+            log.info(f"预过滤拒绝率 {self.rejected / self.checked:.1%} 低于 {PREFILTER_MIN_REJECT_RATE:.0%}，停用预过滤")
+
+    def stats(self) -> Dict[str, float]:
+        """预过滤统计；假阳性率 = 通过预过滤但未匹配的消息 / 所有未匹配的消息"""
+        passed = self.checked - self.rejected
+        false_positives = passed - self.matched
+        non_matching = false_positives + self.rejected
+        return {
+            "active": self.active,
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "passed": passed,
+            "falsePositives": false_positives,
+            "falsePositiveRate": round(false_positives / non_matching, 4) if non_matching else 0.0,
+        }
+
+
+class KeywordMatcher:
+    """
+    预编译的关键词匹配器
+
+    匹配器创建后不再修改，热更新时构建新实例并整体替换引用，
+    正在处理的消息继续使用旧实例，下一条消息即使用新实例。
+    """
+
+    __slots__ = ('keywords', 'use_regex', 'version', '_entries', 'prefilter')
+
+    def __init__(self, keywords: List[str], use_regex: bool = False):
+        self.keywords: Tuple[str, ...] = tuple(keywords)
+        self.use_regex = use_regex
+        self.version = next(_versions)
+        # 每项为 (原始关键词, 编译后的正则或 None, 小写关键词)
+        self._entries: List[Tuple[str, Optional[re.Pattern], str]] = []
+
+        for keyword in self.keywords:
+            if not keyword:  # 跳过空关键词
+                continue
+
+            pattern = None
+            if use_regex:
+                try:
+                    pattern = re.compile(keyword, re.IGNORECASE)
+                except re.error as e:
+                    # 正则表达式语法错误时，降级为普通字符串匹配
+                    log.warning(f"正则表达式语法错误: {keyword}, 错误: {e}，降级为字符串匹配")
+            self._entries.append((keyword, pattern, keyword.lower()))
+
+        self.prefilter: Optional[Prefilter] = None
+        if len(self._entries) >= PREFILTER_MIN_KEYWORDS or any(pattern for _, pattern, _ in self._entries):
+            self.prefilter = Prefilter.build(self._entries)
+
+    def match(self, message_text: str) -> Optional[str]:
+        """
+        返回消息文本匹配到的第一个关键词
+
+        Args:
+            message_text: 消息文本
+
+        Returns:
+            Optional[str]: 匹配的关键词；关键词列表为空时返回"全部消息"；未匹配返回 None
+        """
+        if not self.keywords:
+            return MATCH_ALL_LABEL  # 没有关键词时匹配所有消息
+
+        if not message_text:
+            return None
+
+        prefilter = self.prefilter
+        if prefilter is None or not prefilter.active:
+            return self._match_full(message_text)
+
+        prefilter.checked += 1
+        if not prefilter.may_match(message_text):
+            prefilter.rejected += 1
+            return None
+
+        matched_keyword = self._match_full(message_text)
+        if matched_keyword is not None:
+            prefilter.matched += 1
+        prefilter.check_payoff()
+        return matched_keyword
+
+    def match_all(self, message_text: str) -> FrozenSet[str]:
+        """
+        返回消息文本匹配到的所有关键词（用于编辑消息的差异匹配）
+
+        Returns:
+            FrozenSet[str]: 匹配的关键词集合；关键词列表为空时为 {"全部消息"}
+        """
+        if not self.keywords:
+            return frozenset((MATCH_ALL_LABEL,))
+
+        if not message_text:
+            return frozenset()
+
+        prefilter = self.prefilter
+        if prefilter is not None and prefilter.active and not prefilter.may_match(message_text):
+            return frozenset()
+
+        lowered_text = message_text.lower()
+        return frozenset(
+            keyword for keyword, pattern, lowered_keyword in self._entries
+            if (pattern.search(message_text) if pattern is not None else lowered_keyword in lowered_text)
+        )
+
+    def _match_full(self, message_text: str) -> Optional[str]:
+        """对每个关键词执行完整匹配"""
+        lowered_text = None
+        for keyword, pattern, lowered_keyword in self._entries:
+            if pattern is not None:
+                # 使用正则表达式匹配（忽略大小写）
+                if pattern.search(message_text):
+                    return keyword
+            else:
+                # 使用普通字符串包含匹配（忽略大小写）
+                if lowered_text is None:
+                    lowered_text = message_text.lower()
+                if lowered_keyword in lowered_text:
+                    return keyword
+
+        return None
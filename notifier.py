@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+通知发送模块
+按监控优先级对 Telegram Bot 通知进行加权公平排队（WFQ），并统一控制 Bot API 发送速率
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from logger import get_logger
+
+log = get_logger("notify")
+
+# 优先级及其权重：权重越大，获得的发送带宽份额越大
+PRIORITY_WEIGHTS: Dict[str, int] = {
+    'high': 8,
+    'normal': 4,
+    'bulk': 1,
+}
+DEFAULT_PRIORITY = 'normal'
+
+BOT_API_RATE = 25.0          # 全局发送速率上限（条/秒），低于 Bot API 的 30 条/秒限制
+BOT_API_BURST = 5            # 允许的突发条数
+SEND_WORKERS = 4             # 并发发送协程数
+MAX_QUEUE_PER_PRIORITY = {   # 各优先级的排队上限，超出后丢弃新通知
+    'high': 1000,
+    'normal': 1000,
+    'bulk': 200,
+}
+MAX_ATTEMPTS = 3             # 遇到 429 限流时的最大尝试次数
+SEND_TIMEOUT = 10            # 单次请求超时（秒）
+
+
+@dataclass
+class NotificationJob:
+    """待发送的通知"""
+    monitor_id: str
+    token: str
+    chat_id: str
+    text: str
+    priority: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class _TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    """
+    加权公平队列通知分发器
+
+    每条通知按所属优先级计算虚拟完成时间（上一条同级通知的完成时间与当前虚拟时间的较大值，
+    加上 1/权重），发送时总是取虚拟完成时间最小的通知。这样高优先级监控即使在大量低优先级
+    通知积压时也能保持较低的提醒延迟，而低优先级监控只会被限流而不会饿死。
+    """
+
+    def __init__(self, rate: float = BOT_API_RATE, workers: int = SEND_WORKERS):
+        self._bucket = _TokenBucket(rate, BOT_API_BURST)
+        self._worker_count = workers
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {priority: 0.0 for priority in PRIORITY_WEIGHTS}
+        self._available: Optional[asyncio.Semaphore] = None
+        self._workers: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._paused_until = 0.0
+        self._pending: List[NotificationJob] = []  # 启动前提交的通知
+        self._drained: Optional[asyncio.Event] = None  # drain() 等待期间，全部通知处理完时置位
+        self._stats: Dict[str, Dict[str, float]] = {
+            priority: {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'latency_ms': 0.0}
+            for priority in PRIORITY_WEIGHTS
+        }
+
+    async def start(self):
+        """启动发送协程，并创建共享的 HTTP 连接池"""
+        if self._workers:
+            return
+        self._available = asyncio.Semaphore(0)
+        self._client = httpx.AsyncClient(timeout=SEND_TIMEOUT)
+        pending, self._pending = self._pending, []
+        for job in pending:
+            self._push(job)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    def queued_count(self) -> int:
+        """排队中和发送中的通知总数"""
+        return sum(int(stats['queued']) for stats in self._stats.values())
+
+    async def drain(self, timeout: float) -> int:
+        """
+        等待已入队的通知发送完成（包括被限流后重新入队的），最多等待 timeout 秒
+
+        Returns:
+            int: 超时后仍未发送的通知数
+        """
+        if not self._workers or self.queued_count() == 0:
+            return self.queued_count()
+        self._drained = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._drained = None
+        return self.queued_count()
+
+    async def stop(self):
+        """停止发送协程并关闭 HTTP 连接池"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def submit(self, monitor_id: str, token: str, chat_id: str, text: str, priority: str = DEFAULT_PRIORITY) -> bool:
+        """
+        提交一条通知
+
+        Returns:
+            bool: 是否成功入队（对应优先级队列已满时返回 False）
+        """
+        if priority not in PRIORITY_WEIGHTS:
+            priority = DEFAULT_PRIORITY
+
+        stats = self._stats[priority]
+        if stats['queued'] >= MAX_QUEUE_PER_PRIORITY[priority]:
+            stats['dropped'] += 1
+            return False
+
+        job = NotificationJob(monitor_id=monitor_id, token=token, chat_id=chat_id, text=text, priority=priority)
+        stats['queued'] += 1
+        if self._available is None:
+            self._pending.append(job)
+        else:
+            self._push(job)
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各优先级的发送统计"""
+        return {
+            priority: {**values, 'latency_ms': round(values['latency_ms'], 1)}
+            for priority, values in self._stats.items()
+        }
+
+    def _push(self, job: NotificationJob):
+        """按虚拟完成时间入队"""
+        finish = max(self._virtual_time, self._last_finish[job.priority]) + 1.0 / PRIORITY_WEIGHTS[job.priority]
+        self._last_finish[job.priority] = finish
+        heapq.heappush(self._heap, (finish, next(self._seq), job))
+        self._available.release()
+
+    async def _worker(self):
+        while True:
+            # 每个信号量计数对应堆中的一条通知
+            await self._available.acquire()
+            await self._bucket.acquire()
+
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # 拿到发送额度后再出队，保证取到的是此刻虚拟完成时间最小的通知
+            finish, _, job = heapq.heappop(self._heap)
+            self._virtual_time = max(self._virtual_time, finish)
+            await self._send(job)
+
+    async def _send(self, job: NotificationJob):
+        job.attempts += 1
+        url = f"https://api.telegram.org/bot{job.token}/sendMessage"
+        payload = {
+            'chat_id': job.chat_id,
+            'text': job.text,
+            'parse_mode': 'HTML',
+            'disable_web_page_preview': True  # 禁用链接预览
+        }
+
+        try:
+            response = await self._client.post(url, json=payload)
+        except Exception as e:
+            self._finish(job, success=False)
+            log.error(f"通知失败: {e}", extra=self._log_extra(job))
+            return
+
+        if response.status_code == 200:
+            self._finish(job, success=True)
+            return
+
+        if response.status_code == 429 and job.attempts < MAX_ATTEMPTS:
+            # 被限流时暂停所有发送协程，到期后重新入队
+            retry_after = 1
+            try:
+                retry_after = int(response.json().get('parameters', {}).get('retry_after', 1))
+            except Exception:
+                pass
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._push(job)
+            return
+
+        self._finish(job, success=False)
+        log.error(f"通知失败: {response.status_code} - {response.text}", extra=self._log_extra(job))
+
+    @staticmethod
+    def _log_extra(job: NotificationJob) -> dict:
+        return {
+            'monitor_id': job.monitor_id,
+            'chat_id': job.chat_id,
+            'latency_ms': round((time.monotonic() - job.enqueued_at) * 1000, 1),
+            # 目标不可用时每条通知都会失败，按监控和目标采样
+            'sample_key': f"notify_failed:{job.monitor_id}:{job.chat_id}",
+        }
+
+    def _finish(self, job: NotificationJob, success: bool):
+        stats = self._stats[job.priority]
+        stats['queued'] -= 1
+        if success:
+            stats['sent'] += 1
+            latency_ms = (time.monotonic() - job.enqueued_at) * 1000
+            # 指数滑动平均的提醒延迟
+            stats['latency_ms'] = latency_ms if stats['sent'] == 1 else stats['latency_ms'] * 0.9 + latency_ms * 0.1
+        else:
+            stats['failed'] += 1
+        if self._drained is not None and self.queued_count() == 0:
+            self._drained.set()
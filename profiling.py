@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+性能分析模块（需在配置中开启）
+包括事件循环延迟监控、消息处理各阶段计时、每个监控的累计 CPU 时间，
+以及按需触发的限时采样分析（输出可直接生成火焰图的 collapsed stack 格式）。
+未开启时不包装任何函数、不启动后台任务，热路径上没有额外开销。
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Optional
+
+LAG_SAMPLE_INTERVAL = 0.1    # 事件循环延迟采样间隔（秒）
+LAG_WINDOW = 600             # 保留最近的延迟样本数（默认约 1 分钟）
+PROFILE_MAX_SECONDS = 60.0   # 单次采样分析的最长时间（秒）
+PROFILE_MIN_INTERVAL = 0.001  # 采样间隔下限（秒）
+
+
+class StageStats:
+    """单个处理阶段的累计耗时"""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "totalMs": round(self.total * 1000, 3),
+            "avgMs": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "maxMs": round(self.max * 1000, 3),
+        }
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def sample_stacks(thread_id: int, duration: float, interval: float) -> Counter:
+    """
+    在当前线程中定期读取目标线程的调用栈，统计每个调用栈被采样到的次数
+
+    Returns:
+        Counter: { "文件:函数;文件:函数;...": 次数 }，调用栈从外到内
+    """
+    counts: Counter = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if stack:
+            counts[';'.join(reversed(stack))] += 1
+        del frame
+        time.sleep(interval)
+    return counts
+
+
+class Profiler:
+    """性能分析器，未调用 enable() 时所有包装方法直接返回原函数"""
+
+    def __init__(self):
+        self.enabled = False
+        self._stages: Dict[str, StageStats] = {}
+        self._monitor_cpu: Dict[str, list] = {}  # { monitor_id: [CPU 秒数, 处理的事件数] }
+        self._lag_samples: deque = deque(maxlen=LAG_WINDOW)
+        self._lag_max = 0.0
+        self._lag_task: Optional[asyncio.Task] = None
+        self._sampling = False
+
+    def enable(self):
+        """开启性能分析并启动事件循环延迟监控（需在事件循环中调用）"""
+        self.enabled = True
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._watch_loop_lag())
+
+    def disable(self):
+        self.enabled = False
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            lag = max(0.0, loop.time() - expected)
+            self._lag_samples.append(lag)
+            if lag > self._lag_max:
+                self._lag_max = lag
+
+    # --- 阶段计时 ---
+    def timed(self, stage: str, func: Callable) -> Callable:
+        """包装函数（同步或异步），累计该阶段的耗时"""
+        if not self.enabled:
+            return func
+        stats = self._stages.setdefault(stage, StageStats())
+        perf_counter = time.perf_counter
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    stats.add(perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add(perf_counter() - start)
+        return wrapper
+
+    def instrument_handler(self, monitor_id: str) -> Callable:
+        """
+        消息处理函数的装饰器：计入 handler 阶段耗时，并累计该监控的 CPU 时间
+
+        CPU 时间按事件循环线程的 thread_time 计算，处理函数内部不会挂起等待，
+        因此期间的 CPU 时间都属于该监控。
+        """
+        def decorator(handler: Callable) -> Callable:
+            if not self.enabled:
+                return handler
+            stats = self._stages.setdefault('handler', StageStats())
+            cpu = self._monitor_cpu.setdefault(monitor_id, [0.0, 0])
+            perf_counter, thread_time = time.perf_counter, time.thread_time
+
+            @functools.wraps(handler)
+            async def wrapper(event):
+                start, cpu_start = perf_counter(), thread_time()
+                try:
+                    return await handler(event)
+                finally:
+                    stats.add(perf_counter() - start)
+                    cpu[0] += thread_time() - cpu_start
+                    cpu[1] += 1
+            return wrapper
+        return decorator
+
+    def forget_monitor(self, monitor_id: str):
+        """删除监控时清除其 CPU 统计"""
+        self._monitor_cpu.pop(monitor_id, None)
+
+    # --- 采样分析 ---
+    async def sample(self, duration: float, interval: float) -> str:
+        """
+        在后台线程中对事件循环线程做限时采样
+
+        Returns:
+            str: collapsed stack 格式（每行 "调用栈 次数"），可用 flamegraph.pl 或 speedscope 生成火焰图
+
+        Raises:
+            RuntimeError: 已有采样正在进行
+        """
+        if self._sampling:
+            raise RuntimeError("已有采样分析正在进行")
+        self._sampling = True
+        try:
+            loop_thread_id = threading.get_ident()
+            counts = await asyncio.to_thread(sample_stacks, loop_thread_id, duration, interval)
+        finally:
+            self._sampling = False
+        return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    # --- 统计 ---
+    def stats(self) -> Dict[str, Any]:
+        lag_ms = [lag * 1000 for lag in self._lag_samples]
+        return {
+            "enabled": self.enabled,
+            "loopLag": {
+                "currentMs": round(lag_ms[-1], 3) if lag_ms else 0.0,
+                "p50Ms": round(_percentile(lag_ms, 50), 3),
+                "p99Ms": round(_percentile(lag_ms, 99), 3),
+                "maxMs": round(self._lag_max * 1000, 3),
+                "samples": len(lag_ms),
+            },
+            "stages": {stage: stats.to_dict() for stage, stats in self._stages.items()},
+            "monitors": {
+                monitor_id: {
+                    "cpuMs": round(cpu_seconds * 1000, 3),
+                    "events": events,
+                    "avgCpuMs": round(cpu_seconds / events * 1000, 3) if events else 0.0,
+                }
+                for monitor_id, (cpu_seconds, events) in sorted(
+                    self._monitor_cpu.items(), key=lambda item: item[1][0], reverse=True)
+            },
+        }
+
+
+# 全局性能分析器
+profiler = Profiler()
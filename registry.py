@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+监控注册表模块
+以紧凑的 __slots__ 记录保存监控任务，频道标识符和关键词字符串驻留（intern），
+关键词集合相同的监控共享同一个关键词元组和预编译匹配器
+"""
+
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from logger import get_logger
+from matcher import KeywordMatcher
+from match_cache import LRUCache, EDIT_TRACK_SIZE
+
+log = get_logger("server")
+
+# 监控状态
+STATUS_STARTING = 'starting'
+STATUS_RUNNING = 'running'
+STATUS_RETRYING = 'retrying'
+STATUS_STOPPED = 'stopped'
+STATUS_ERROR = 'error'
+
+
+def intern_strings(values: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """将字符串列表转换为驻留字符串元组，None 保持为 None"""
+    if values is None:
+        return None
+    return tuple(sys.intern(str(value)) for value in values)
+
+
+class KeywordPool:
+    """
+    关键词匹配器池
+
+    以 (关键词元组, 是否正则) 为键对匹配器做引用计数，关键词集合相同的监控共享同一个
+    匹配器实例（及其中的关键词元组和编译后的正则），最后一个使用者释放后才会删除。
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[Tuple[str, ...], bool], list] = {}  # { key: [matcher, 引用计数] }
+
+    def acquire(self, keywords: Iterable[str], use_regex: bool = False) -> KeywordMatcher:
+        """获取（必要时创建）关键词集合对应的共享匹配器"""
+        key = (intern_strings(keywords), bool(use_regex))
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = [KeywordMatcher(key[0], key[1]), 0]
+            self._entries[key] = entry
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, matcher: Optional[KeywordMatcher]):
+        """释放一次对匹配器的引用"""
+        if matcher is None:
+            return
+        key = (matcher.keywords, matcher.use_regex)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not matcher:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全局共享的关键词匹配器池
+keyword_pool = KeywordPool()
+
+
+class Monitor:
+    """单个监控任务的记录（包括已停止的）"""
+
+    __slots__ = (
+        'id', 'channel', 'channel_title', 'matcher', 'chat_ids', 'priority', 'status',
+        # 编辑消息监听：{ message_id: 已匹配关键词集合 }，未开启时为 None
+        'watch_edits', 'seen_matches',
+        # 运行时状态
+        'client', 'task',
+        # 监控守护状态
+        'restarts', 'failures', 'next_retry_at', 'last_error', 'circuit_open',
+    )
+
+    def __init__(self, monitor_id: str, channel: str, keywords: Iterable[str], use_regex: bool = False,
+                 chat_ids: Optional[Iterable[str]] = None, priority: str = 'normal',
+                 watch_edits: bool = False, pool: KeywordPool = keyword_pool):
+        self.id = sys.intern(monitor_id)
+        self.channel = sys.intern(channel)
+        self.channel_title: Optional[str] = None
+        self.matcher = pool.acquire(keywords, use_regex)
+        self.chat_ids = intern_strings(chat_ids) or None  # 空列表等同于未设置
+        self.priority = sys.intern(priority)
+        self.status = STATUS_STARTING
+        self.seen_matches: Optional[LRUCache] = None
+        self.set_watch_edits(watch_edits)
+        self.client: Any = None  # 已连接的 TelegramClient，未连接时为 None
+        self.task: Optional[asyncio.Task] = None  # 监控守护任务
+        self.reset_supervisor()
+
+    @property
+    def keywords(self) -> Tuple[str, ...]:
+        return self.matcher.keywords
+
+    @property
+    def use_regex(self) -> bool:
+        return self.matcher.use_regex
+
+    @property
+    def is_connected(self) -> bool:
+        """客户端是否已连接并注册"""
+        return self.client is not None
+
+    def reset_supervisor(self):
+        """重置监控守护状态（启动或恢复时调用）"""
+        self.restarts = 0           # 累计自动重启次数
+        self.failures = 0           # 连续失败次数
+        self.next_retry_at: Optional[float] = None  # 下次重试的时间戳（秒）
+        self.last_error: Optional[str] = None
+        self.circuit_open = False   # 是否已因连续失败停止重试
+
+    def set_watch_edits(self, watch_edits: bool):
+        """开启或关闭编辑消息监听，关闭时丢弃已记录的匹配结果"""
+        self.watch_edits = bool(watch_edits)
+        if not self.watch_edits:
+            self.seen_matches = None
+        elif self.seen_matches is None:
+            self.seen_matches = LRUCache(EDIT_TRACK_SIZE)
+
+    def set_keywords(self, keywords: Iterable[str], use_regex: bool, pool: KeywordPool = keyword_pool):
+        """
+        替换关键词集合：先获取新的共享匹配器，再一次性替换引用，最后释放旧匹配器
+        """
+        old_matcher = self.matcher
+        self.matcher = pool.acquire(keywords, use_regex)
+        pool.release(old_matcher)
+
+    def release(self, pool: KeywordPool = keyword_pool):
+        """删除监控时释放共享资源"""
+        pool.release(self.matcher)
+
+    def to_status(self) -> Dict[str, Any]:
+        """生成 /status 接口中的监控信息"""
+        # 解析频道名称，去除 @ 前缀用于展示
+        channel_display = self.channel[1:] if self.channel.startswith('@') else self.channel
+        return {
+            "id": self.id,
+            "channel": channel_display,
+            "channelTitle": self.channel_title or channel_display,
+            "keywords": list(self.keywords),
+            "useRegex": self.use_regex,
+            "chatIds": list(self.chat_ids) if self.chat_ids else None,
+            "priority": self.priority,
+            "watchEdits": self.watch_edits,
+            "status": self.status,
+            "restarts": self.restarts,
+            "nextRetryAt": self.next_retry_at,
+            "lastError": self.last_error,
+            "circuitOpen": self.circuit_open,
+            # 预过滤统计属于共享匹配器，关键词集合相同的监控共用同一份
+            "prefilter": self.matcher.prefilter.stats() if self.matcher.prefilter else None,
+        }
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """生成检查点记录（配置和是否需要在重启后恢复运行）"""
+        return {
+            "id": self.id,
+            "channel": self.channel,
+            "keywords": list(self.keywords),
+            "useRegex": self.use_regex,
+            "chatIds": list(self.chat_ids) if self.chat_ids else None,
+            "priority": self.priority,
+            "watchEdits": self.watch_edits,
+            # 记录用户的意图而不是当前状态：只要没有被手动停止，下次启动时都重新运行，
+            # 正在等待重试或因连接失败处于 error 的监控也不会因为一次重新部署而永久停止
+            "running": self.status != STATUS_STOPPED,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict[str, Any], pool: KeywordPool = keyword_pool) -> 'Monitor':
+        """从检查点记录创建监控（状态为已停止，由调用方决定是否启动）"""
+        monitor = cls(
+            data['id'],
+            data['channel'],
+            data.get('keywords') or [],
+            bool(data.get('useRegex', False)),
+            chat_ids=data.get('chatIds'),
+            priority=data.get('priority') or 'normal',
+            watch_edits=bool(data.get('watchEdits', False)),
+            pool=pool
+        )
+        monitor.status = STATUS_STOPPED
+        return monitor
+
+
+def checkpoint_data(monitors: Iterable[Monitor]) -> Dict[str, Any]:
+    """生成检查点内容（在事件循环线程中调用，返回的数据与监控不再共享）"""
+    return {"version": 1, "monitors": [monitor.to_checkpoint() for monitor in monitors]}
+
+
+def save_checkpoint(path: str, monitors: Iterable[Monitor]):
+    """原子写入监控检查点：先写临时文件，再重命名覆盖"""
+    write_checkpoint(path, checkpoint_data(monitors))
+
+
+def write_checkpoint(path: str, data: Dict[str, Any]):
+    """原子写入检查点内容（可在线程池中调用）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> List[Dict[str, Any]]:
+    """读取监控检查点，文件不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return list(data.get('monitors', []))
+
+
+class CheckpointWriter:
+    """
+    注册表变更后在后台重写监控检查点
+
+    非正常退出（OOM、SIGKILL、宿主机故障）后，下次启动恢复的是最近一次变更后的注册表，
+    而不是上次正常关闭时的状态。连续的变更合并为一次写入，写入在线程池中执行，
+    同一时间只有一个写入进行，较旧的内容不会覆盖较新的内容。
+    """
+
+    def __init__(self, path: str, monitors: Dict[str, Monitor]):
+        self.path = path
+        self._monitors = monitors
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self):
+        """注册表变更后调用（需在事件循环中调用）"""
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._dirty:
+            self._dirty = False
+            data = checkpoint_data(self._monitors.values())
+            try:
+                await asyncio.to_thread(write_checkpoint, self.path, data)
+            except Exception as e:
+                log.error(f"❌ 写入监控检查点失败: {e}")
+
+    async def wait(self):
+        """等待进行中的写入完成（关闭时在最终同步写入前调用）"""
+        if self._task is not None:
+            await self._task
@@ -1,90 +1,176 @@
 import asyncio
 import os
-import httpx
-import re
+import random
 import sys
-import socket
+import signal
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Literal
 
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 from config import config as server_config
+from registry import (
+    Monitor, CheckpointWriter, intern_strings, save_checkpoint, load_checkpoint,
+    STATUS_STARTING, STATUS_RUNNING, STATUS_RETRYING, STATUS_STOPPED, STATUS_ERROR
+)
+from notifier import NotificationDispatcher, DEFAULT_PRIORITY
+from match_cache import match_cache, CachedMatch
+from matcher import KeywordMatcher
+from session_store import SESSION_BACKEND_SQLITE, SESSION_BACKEND_MEMORY, open_memory_session, session_flusher
+from profiling import profiler, PROFILE_MAX_SECONDS, PROFILE_MIN_INTERVAL
+from logger import setup_logging, get_logger, shutdown_logging
+
+# --- 日志 ---
+_logging_config = server_config.snapshot.logging
+setup_logging(
+    level=_logging_config.level,
+    levels=_logging_config.levels,
+    fmt=_logging_config.format,
+    sample_interval=_logging_config.sample_interval,
+    sample_burst=_logging_config.sample_burst
+)
+server_log = get_logger("server")
+monitor_log = get_logger("monitor")
+notify_log = get_logger("notify")
+config_log = get_logger("config")
+connectivity_log = get_logger("connectivity")
 
 # --- 网络连接检查函数 ---
-async def check_telegram_connectivity():
-    """检查网络连接到 Telegram 服务器"""
+# Telegram 服务器列表
+TELEGRAM_SERVERS = [
+    ("149.154.167.51", 443),
+    ("149.154.175.53", 443),
+    ("91.108.56.165", 443),
+]
+CONNECTIVITY_TIMEOUT = 3.0     # 单个探测的超时时间（秒）
+CONNECTIVITY_CACHE_TTL = 30.0  # 检查结果缓存时间（秒）
+
+# 最近一次连接检查结果，供 /health 读取
+connectivity_state: Dict = {
+    'ok': None,           # None 表示尚未完成检查
+    'mode': None,         # 'direct' 或 'proxy'
+    'latencies_ms': {},   # { 'host:port': 延迟毫秒 或 None（不可达） }
+    'checked_at': None,   # time.monotonic() 时间戳
+}
+_connectivity_task: Optional[asyncio.Task] = None
+
+async def probe_tcp(host: str, port: int, timeout: float = CONNECTIVITY_TIMEOUT) -> Optional[float]:
+    """非阻塞 TCP 探测，返回建立连接耗时（毫秒），失败返回 None"""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latency_ms = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency_ms
+
+async def probe_via_proxy(proxy_config: Dict, host: str, port: int,
+                          timeout: float = CONNECTIVITY_TIMEOUT) -> Optional[float]:
+    """
+    通过代理与 Telegram 服务器建立 TCP 连接，返回耗时（毫秒），失败返回 None
     
-    # 获取代理配置
-    proxy_config = server_config.telegram.proxy.get_proxy_dict()
+    使用与 Telethon 相同的 python-socks 完成代理握手，代理端口可连接但无法访问 Telegram 时同样视为失败
+    """
+    try:
+        from python_socks import ProxyType
+        from python_socks.async_.asyncio import Proxy
+    except ImportError:
+        connectivity_log.error("❌ 代理模式需要安装 python-socks: pip install 'python-socks[asyncio]'")
+        return None
     
-    # Telegram 服务器列表
-    telegram_servers = [
-        ("149.154.167.51", 443),
-        ("149.154.175.53", 443),
-        ("91.108.56.165", 443),
-    ]
+    try:
+        proxy = Proxy(
+            ProxyType[proxy_config['proxy_type'].upper()],
+            proxy_config['addr'],
+            proxy_config['port'],
+            username=proxy_config.get('username'),
+            password=proxy_config.get('password')
+        )
+    except KeyError:
+        connectivity_log.error(f"❌ 不支持的代理类型: {proxy_config['proxy_type']}")
+        return None
     
-    connection_success = False
+    start = time.perf_counter()
+    try:
+        sock = await proxy.connect(host, port, timeout=timeout)
+    except Exception:
+        return None
+    latency_ms = (time.perf_counter() - start) * 1000
+    sock.close()
+    return latency_ms
+
+async def _run_connectivity_check() -> Dict:
+    """并发探测所有 Telegram 服务器（代理模式下经由代理），任一成功即返回，其余探测在后台继续记录延迟"""
+    proxy_config = server_config.snapshot.telegram.proxy.get_proxy_dict()
+    mode = 'proxy' if proxy_config else 'direct'
     
-    if proxy_config:
-        print(f"使用代理: {proxy_config['proxy_type']}://{proxy_config['addr']}:{proxy_config['port']}")
-        
-        try:
-            session_path = os.path.join(SESSION_DIR, "connectivity_test.session")
-            test_client = TelegramClient(
-                session_path,
-                int(server_config.telegram.api_id),
-                server_config.telegram.api_hash,
-                proxy=proxy_config
-            )
-            
-            await test_client.connect()
-            print("✅ 代理连接成功")
-            connection_success = True
-            await test_client.disconnect()
-            
-            if os.path.exists(session_path):
-                os.remove(session_path)
-            
-        except Exception as e:
-            print(f"❌ 代理连接失败: {e}")
-    else:
-        print("检查直连...")
-        
-        for server, port in telegram_servers:
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                result = sock.connect_ex((server, port))
-                sock.close()
-                
-                if result == 0:
-                    print(f"✅ 直连成功: {server}")
-                    connection_success = True
-                    break
-            except Exception:
-                continue
-    
-    if not connection_success:
-        print("\n❌ 无法连接 Telegram 服务器")
-        print("解决方案:")
-        print("1. 检查网络连接")
-        print("2. 配置代理: python setup.py")
-        
-        try:
-            user_input = input("\n配置代理? (y/n): ").strip().lower()
-            if user_input in ['y', 'yes']:
-                print("运行: python setup.py")
-                sys.exit(1)
-            else:
-                print("⚠️  跳过代理配置")
-        except KeyboardInterrupt:
-            sys.exit(1)
+    latencies: Dict[str, Optional[float]] = {}
+    
+    async def probe(host: str, port: int) -> Optional[float]:
+        if proxy_config:
+            latency_ms = await probe_via_proxy(proxy_config, host, port)
+        else:
+            latency_ms = await probe_tcp(host, port)
+        latencies[f"{host}:{port}"] = round(latency_ms, 1) if latency_ms is not None else None
+        return latency_ms
+    
+    pending = {asyncio.create_task(probe(host, port)) for host, port in TELEGRAM_SERVERS}
+    ok = False
+    while pending and not ok:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        ok = any(task.result() is not None for task in done)
+    
+    connectivity_state.update({
+        'ok': ok,
+        'mode': mode,
+        'latencies_ms': latencies,
+        'checked_at': time.monotonic(),
+    })
+    return connectivity_state
+
+async def check_telegram_connectivity(force: bool = False) -> Dict:
+    """
+    检查网络连接到 Telegram 服务器（配置了代理时经由代理）
+    
+    结果缓存 CONNECTIVITY_CACHE_TTL 秒，并发调用共享同一次检查
+    """
+    global _connectivity_task
+    
+    checked_at = connectivity_state['checked_at']
+    if not force and checked_at is not None and time.monotonic() - checked_at < CONNECTIVITY_CACHE_TTL:
+        return connectivity_state
+    
+    if _connectivity_task is None or _connectivity_task.done():
+        _connectivity_task = asyncio.create_task(_run_connectivity_check())
+    return await asyncio.shield(_connectivity_task)
+
+async def report_startup_connectivity():
+    """启动时在后台执行连接检查并输出结果，不阻塞服务启动"""
+    state = await check_telegram_connectivity(force=True)
+    if state['mode'] == 'proxy':
+        proxy_config = server_config.snapshot.telegram.proxy.get_proxy_dict()
+        connectivity_log.info(f"使用代理: {proxy_config['proxy_type']}://{proxy_config['addr']}:{proxy_config['port']}")
+    
+    if state['ok']:
+        reachable = {target: latency for target, latency in state['latencies_ms'].items() if latency is not None}
+        target, latency = min(reachable.items(), key=lambda item: item[1])
+        connectivity_log.info(f"✅ 连接检查通过: {target}", extra={'latency_ms': latency})
     else:
-        print("✅ 连接检查通过")
+        connectivity_log.error(
+            "❌ 无法连接 Telegram 服务器。解决方案: 1. 检查网络连接 2. 在 app_config.yaml 中配置代理（修改后自动重载）"
+        )
 
 # --- Pydantic 模型 ---
 class MonitorConfig(BaseModel):
@@ -93,23 +179,67 @@ class MonitorConfig(BaseModel):
     channel: str
     keywords: List[str]
     useRegex: bool = False  # 是否使用正则表达式匹配
+    chatIds: Optional[List[str]] = None  # 通知目标，为空时使用服务器配置的 Chat IDs
+    priority: Literal['high', 'normal', 'bulk'] = DEFAULT_PRIORITY  # 通知优先级
+    watchEdits: bool = False  # 是否监听消息编辑，编辑后出现新关键词时再次提醒
 
 class StopRequestBody(BaseModel):
     id: str
 
+class MonitorUpdateBody(BaseModel):
+    """监控热更新请求体（未提供的字段保持不变）"""
+    keywords: Optional[List[str]] = None
+    useRegex: Optional[bool] = None
+    chatIds: Optional[List[str]] = None
+    priority: Optional[Literal['high', 'normal', 'bulk']] = None
+    watchEdits: Optional[bool] = None
+
 # --- 配置 ---
 SESSION_DIR = "sessions"
 os.makedirs(SESSION_DIR, exist_ok=True)
+CONFIG_WATCH_INTERVAL = 2.0  # 配置文件变更检查间隔（秒）
+MONITOR_START_TIMEOUT = 2.0  # 启动/恢复接口等待监控就绪的最长时间（秒）
+MONITOR_CHECKPOINT_FILE = os.path.join(SESSION_DIR, "monitors.json")  # 监控注册表检查点（每次变更和关闭时写入）
+
+# 优雅关闭配置
+SHUTDOWN_DRAIN_TIMEOUT = 10.0       # 等待通知队列发送完成的最长时间（秒）
+SHUTDOWN_DISCONNECT_TIMEOUT = 5.0   # 等待所有客户端断开连接的最长时间（秒）
+
+# 监控守护（自动重启）配置
+RESTART_BASE_DELAY = 1.0          # 首次重启等待时间（秒）
+RESTART_MAX_DELAY = 300.0         # 重启等待时间上限（秒）
+CIRCUIT_BREAKER_THRESHOLD = 5     # 连续失败次数达到该值后停止重试
+STABLE_RUN_SECONDS = 60.0         # 运行超过该时长视为已恢复，重置连续失败计数
+# 重试无法解决的错误，出现时直接停止
+PERMANENT_ERRORS = ("AUTH_KEY_UNREGISTERED", "PHONE_NUMBER_INVALID", "Could not find the input entity")
 
 # --- 全局变量 ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动检查与恢复，收到 SIGTERM 等关闭信号后优雅关闭"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
 app = FastAPI(
     title="Telemon Backend",
     description="一个基于 FastAPI 的后端服务，用于执行 Telegram 监控任务。",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan
 )
-active_monitors: Dict[str, Dict] = {}  # { 'monitor_id': {'client': client, 'task': task, 'config': config} }
-monitor_configs: Dict[str, Dict] = {}  # 存储所有监控配置信息（包括已停止的），格式: {'config': {...}, 'status': 'running'|'stopped'}
+monitors: Dict[str, Monitor] = {}  # 所有监控任务（包括已停止的），{ 'monitor_id': Monitor }
+notification_dispatcher = NotificationDispatcher()
+shutting_down = False  # 关闭开始后不再处理新消息、不再启动或重启监控
+checkpoint_writer = CheckpointWriter(MONITOR_CHECKPOINT_FILE, monitors)
+# 启动时确定的会话后端；与其他 server 配置一样，热重载后需重启服务才生效，
+# 避免新旧后端混用（内存会话没有落盘任务，或切回 sqlite 后找不到会话而等待登录）
+session_backend = SESSION_BACKEND_SQLITE
+_config_watch_task: Optional[asyncio.Task] = None
+_session_flush_task: Optional[asyncio.Task] = None
+_restore_task: Optional[asyncio.Task] = None
 
 # --- CORS 中间件 ---
 app.add_middleware(
@@ -146,82 +276,16 @@ def parse_channel_identifier(channel: str) -> str:
     
     return channel
 
-def get_matched_keyword(message_text: str, keywords: List[str], use_regex: bool = False) -> str:
-    """
-    获取消息文本匹配的关键词
-    
-    Args:
-        message_text: 消息文本
-        keywords: 关键词列表
-        use_regex: 是否使用正则表达式匹配
-    
-    Returns:
-        str: 匹配的关键词，如果没有关键词返回"全部消息"
-    """
-    if not keywords:
-        return "全部消息"
-    
-    if not message_text:
-        return "未知"
-    
-    for keyword in keywords:
-        if not keyword:  # 跳过空关键词
-            continue
-            
-        try:
-            if use_regex:
-                # 使用正则表达式匹配（忽略大小写）
-                if re.search(keyword, message_text, re.IGNORECASE):
-                    return keyword
-            else:
-                # 使用普通字符串包含匹配（忽略大小写）
-                if keyword.lower() in message_text.lower():
-                    return keyword
-        except re.error:
-            # 正则表达式语法错误时，降级为普通字符串匹配
-            if keyword.lower() in message_text.lower():
-                return keyword
-    
-    return "未知"
-
-def check_keyword_match(message_text: str, keywords: List[str], use_regex: bool = False) -> bool:
+def validate_chat_ids(chat_ids: Optional[List[str]]):
     """
-    检查消息文本是否匹配关键词列表
+    验证监控自定义的 Chat ID 列表（可以以负号开头的数字）
     
-    Args:
-        message_text: 消息文本
-        keywords: 关键词列表
-        use_regex: 是否使用正则表达式匹配
-    
-    Returns:
-        bool: 是否匹配
+    Raises:
+        ValueError: Chat ID 格式错误
     """
-    if not keywords:
-        return True  # 没有关键词时匹配所有消息
-    
-    if not message_text:
-        return False
-    
-    for keyword in keywords:
-        if not keyword:  # 跳过空关键词
-            continue
-            
-        try:
-            if use_regex:
-                # 使用正则表达式匹配（忽略大小写）
-                if re.search(keyword, message_text, re.IGNORECASE):
-                    return True
-            else:
-                # 使用普通字符串包含匹配（忽略大小写）
-                if keyword.lower() in message_text.lower():
-                    return True
-        except re.error as e:
-            # 正则表达式语法错误时，降级为普通字符串匹配
-            print(f"正则表达式语法错误: {keyword}, 错误: {e}，降级为字符串匹配")
-            if keyword.lower() in message_text.lower():
-                return True
-    
-    return False
+    for chat_id in chat_ids or []:
+        if not str(chat_id).lstrip('-').isdigit():
+            raise ValueError(f"Chat ID 格式错误: {chat_id}")
 
 # --- Telegram Bot 通知逻辑 ---
 def escape_html(text: str) -> str:
@@ -252,103 +316,103 @@ def escape_html(text: str) -> str:
     
     return text
 
-async def send_telegram_message(config: dict, message_text: str, message_link: str):
-    # 使用服务器配置的Bot
-    if not server_config.validate_bot():
+def render_preview(message_text: str) -> str:
+    """生成通知中的消息预览：截取前100个字符并转义"""
+    preview_text = message_text[:100] + "..." if len(message_text) > 100 else message_text
+    return escape_html(preview_text)
+
+async def send_telegram_message(monitor: Monitor, matched_keyword: str, preview: str, message_link: str):
+    # 使用服务器配置的Bot，整条消息只读取一次配置快照
+    snapshot = server_config.snapshot
+    if not snapshot.bot_valid:
         return
 
-    token = server_config.bot_token
-    chat_ids = server_config.chat_ids
-    
-    # 获取匹配的关键词
-    keywords = config.get('keywords', [])
-    use_regex = config.get('useRegex', False)
-    matched_keyword = get_matched_keyword(message_text, keywords, use_regex)
-    
-    # 截取消息内容为100个字符
-    preview_text = message_text[:100] + "..." if len(message_text) > 100 else message_text
-    
-    # 构造新的消息格式（保留链接但禁用预览）
-    notification_content = f"📢 <b>Telemon 提醒</b>\n\n- <b>关键词：</b>{matched_keyword}\n- <b>消息内容：</b>{escape_html(preview_text)}\n- <b>原文链接：</b><a href='{message_link}'>点击查看完整内容</a>\n- <b>消息分析：</b>待开发"
+    token = snapshot.bot.token
+    # 监控自定义的通知目标优先，否则使用服务器配置的 Chat IDs
+    chat_ids = monitor.chat_ids or snapshot.bot.chat_ids or []
+    priority = monitor.priority
     
-    # 串行发送到多个 Chat ID
-    successful_sends = []
-    failed_sends = []
+    # 构造新的消息格式（保留链接但禁用预览），preview 为已转义的消息预览
+    notification_content = f"📢 <b>Telemon 提醒</b>\n\n- <b>关键词：</b>{matched_keyword}\n- <b>消息内容：</b>{preview}\n- <b>原文链接：</b><a href='{message_link}'>点击查看完整内容</a>\n- <b>消息分析：</b>待开发"
     
+    # 按监控优先级加权公平排队，由分发器统一限速发送
+    dropped_count = 0
     for chat_id in chat_ids:
-        payload = {
-            'chat_id': chat_id,
-            'text': notification_content,
-            'parse_mode': 'HTML',
-            'disable_web_page_preview': True  # 禁用链接预览
-        }
-        
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, timeout=10)
-                if response.status_code == 200:
-                    successful_sends.append(chat_id)
-                else:
-                    failed_sends.append({"chat_id": chat_id, "error": f"{response.status_code} - {response.text}"})
-        except Exception as e:
-            failed_sends.append({"chat_id": chat_id, "error": str(e)})
-    
-    # 记录发送结果
-    success_count = len(successful_sends)
-    failed_count = len(failed_sends)
+        if not notification_dispatcher.submit(monitor.id, token, chat_id, notification_content, priority):
+            dropped_count += 1
     
-    if failed_count > 0:
-        print(f"[{config['id']}] 通知: {success_count}成功 {failed_count}失败")
+    if dropped_count > 0:
+        notify_log.warning(
+            f"通知队列已满，丢弃 {dropped_count} 条（优先级: {priority}）",
+            extra={'monitor_id': monitor.id, 'sample_key': f"dropped:{monitor.id}"}
+        )
 
 # --- Telethon 监控逻辑 ---
-async def monitor_channel(config: dict, task_ref: dict):
-    # 使用服务器配置而非前端传递的参数
-    session_path = os.path.join(SESSION_DIR, f"{config['id']}.session")
+def check_keyword_match(matcher: KeywordMatcher, message_text: str, all_keywords: bool = False) -> CachedMatch:
+    """
+    检查消息是否匹配关键词，重复、转发的相同文本直接命中匹配缓存
     
-    # 如果特定的会话文件不存在，尝试使用默认会话文件
-    default_session_path = os.path.join(SESSION_DIR, "default.session")
-    if not os.path.exists(session_path) and os.path.exists(default_session_path):
-        print(f"[{config['id']}] 特定会话文件不存在，使用默认会话: {default_session_path}")
-        session_path = default_session_path
+    Args:
+        matcher: 本条消息使用的匹配器
+        message_text: 消息文本
+        all_keywords: 是否同时计算所有匹配的关键词（编辑消息的差异匹配使用）
+    """
+    if all_keywords:
+        return match_cache.lookup_all(matcher, message_text)
+    return match_cache.lookup(matcher, message_text)
+
+async def monitor_channel(monitor: Monitor, task_ref: dict):
+    monitor_id = monitor.id
+    
+    # 使用服务器配置而非前端传递的参数
+    snapshot = server_config.snapshot
+    if session_backend == SESSION_BACKEND_MEMORY:
+        # 内存会话：状态保存在内存中，定期原子写入快照文件
+        session = open_memory_session(SESSION_DIR, monitor_id)
+        monitor_log.info(f"使用内存会话，加载自: {session.source or '新会话'}", extra={'monitor_id': monitor_id})
+    else:
+        session = os.path.join(SESSION_DIR, f"{monitor_id}.session")
+        
+        # 如果特定的会话文件不存在，尝试使用默认会话文件
+        default_session_path = os.path.join(SESSION_DIR, "default.session")
+        if not os.path.exists(session) and os.path.exists(default_session_path):
+            monitor_log.info(f"特定会话文件不存在，使用默认会话: {default_session_path}", extra={'monitor_id': monitor_id})
+            session = default_session_path
     
     # 创建客户端，如果配置了代理则使用代理
-    proxy_config = server_config.telegram.proxy.get_proxy_dict()
+    telegram_config = snapshot.telegram
+    proxy_config = telegram_config.proxy.get_proxy_dict()
     if proxy_config:
-        print(f"[{config['id']}] 使用代理连接: {proxy_config['proxy_type']}://{proxy_config['addr']}:{proxy_config['port']}")
+        monitor_log.info(f"使用代理连接: {proxy_config['proxy_type']}://{proxy_config['addr']}:{proxy_config['port']}", extra={'monitor_id': monitor_id})
         client = TelegramClient(
-            session_path,
-            int(server_config.telegram.api_id),
-            server_config.telegram.api_hash,
+            session,
+            int(telegram_config.api_id),
+            telegram_config.api_hash,
             proxy=proxy_config
         )
     else:
-        print(f"[{config['id']}] 直连 Telegram 服务器")
+        monitor_log.info("直连 Telegram 服务器", extra={'monitor_id': monitor_id})
         client = TelegramClient(
-            session_path,
-            int(server_config.telegram.api_id),
-            server_config.telegram.api_hash
+            session,
+            int(telegram_config.api_id),
+            telegram_config.api_hash
         )
     
-    monitor_id = config['id']
-    
     try:
         # 解析频道标识符
-        original_channel = config['channel']
-        parsed_channel = parse_channel_identifier(original_channel)
-        keywords = config.get('keywords', [])
-        use_regex = config.get('useRegex', False)
+        parsed_channel = parse_channel_identifier(monitor.channel)
+        keywords = monitor.keywords
+        use_regex = monitor.use_regex
         
-        print(f"[{monitor_id}] 监控频道: {parsed_channel}")
+        monitor_log.info(f"监控频道: {parsed_channel}", extra={'monitor_id': monitor_id, 'channel': parsed_channel})
         if keywords:
             keyword_text = ', '.join(keywords[:3])  # 只显示前3个关键词避免输出过长
             if len(keywords) > 3:
                 keyword_text += f" (共{len(keywords)}个)"
             regex_flag = " [正则]" if use_regex else ""
-            print(f"[{monitor_id}] 关键词: {keyword_text}{regex_flag}")
+            monitor_log.info(f"关键词: {keyword_text}{regex_flag}", extra={'monitor_id': monitor_id})
         else:
-            print(f"[{monitor_id}] 关键词: 全部消息")
+            monitor_log.info("关键词: 全部消息", extra={'monitor_id': monitor_id})
         
         try:
             # 先连接客户端
@@ -356,113 +420,343 @@ async def monitor_channel(config: dict, task_ref: dict):
             
             # 检查是否需要验证
             if not await client.is_user_authorized():
-                print(f"[{monitor_id}] 首次登录，等待验证码...")
-                await client.start(phone=server_config.telegram.phone)
-                print(f"[{monitor_id}] ✅ 认证完成")
+                monitor_log.info("首次登录，等待验证码...", extra={'monitor_id': monitor_id})
+                await client.start(phone=telegram_config.phone)
+                monitor_log.info("✅ 认证完成", extra={'monitor_id': monitor_id})
             
-            print(f"[{monitor_id}] ✅ 连接成功")
+            monitor_log.info("✅ 连接成功", extra={'monitor_id': monitor_id})
         except Exception as e:
             error_str = str(e)
-            print(f"[{monitor_id}] ❌ 连接失败: {error_str}")
+            monitor_log.error(f"❌ 连接失败: {error_str}", extra={'monitor_id': monitor_id})
             
             if "AUTH_KEY_UNREGISTERED" in error_str:
-                print(f"[{monitor_id}] 错误: API 凭证无效")
+                monitor_log.error("错误: API 凭证无效", extra={'monitor_id': monitor_id})
             elif "PHONE_NUMBER_INVALID" in error_str:
-                print(f"[{monitor_id}] 错误: 手机号无效")
+                monitor_log.error("错误: 手机号无效", extra={'monitor_id': monitor_id})
             elif "ConnectionError" in error_str or "TimeoutError" in error_str:
-                print(f"[{monitor_id}] 错误: 网络连接问题")
+                monitor_log.error("错误: 网络连接问题", extra={'monitor_id': monitor_id})
             raise
         
-        current_task = asyncio.current_task()
-        task_ref['task'] = current_task
-        active_monitors[monitor_id] = {'client': client, 'task': current_task, 'config': config}
+        task_ref['task'] = asyncio.current_task()
+        monitor.client = client
         
         # 获取频道实体
         try:
             channel_entity = await client.get_entity(parsed_channel)
             channel_title = channel_entity.title if hasattr(channel_entity, 'title') else parsed_channel
-            print(f"[{monitor_id}] ✅ 获取频道: {channel_title}")
-            
-            if monitor_id in monitor_configs:
-                monitor_configs[monitor_id]['config']['channelTitle'] = channel_title
+            monitor_log.info(f"✅ 获取频道: {channel_title}", extra={'monitor_id': monitor_id, 'channel': parsed_channel})
+            monitor.channel_title = sys.intern(channel_title)
         except Exception as e:
-            print(f"[{monitor_id}] ❌ 无法获取频道: {e}")
+            monitor_log.error(f"❌ 无法获取频道: {e}", extra={'monitor_id': monitor_id, 'channel': parsed_channel})
             raise
         
+        def build_message_link(message_obj) -> str:
+            """构造消息链接"""
+            if hasattr(channel_entity, 'username') and channel_entity.username:
+                return f"https://t.me/{channel_entity.username}/{message_obj.id}"
+            else: # 私有频道
+                return f"https://t.me/c/{channel_entity.id}/{message_obj.id}"
+        
+        async def notify_match(message_obj, entry, matched_keyword: str, edited: bool = False):
+            """记录匹配日志并发送通知，预览只在第一次需要时渲染并缓存"""
+            # 消息发布到匹配完成的延迟；同一监控的匹配日志按时间窗口采样输出
+            latency_ms = None
+            message_date = message_obj.edit_date if edited else message_obj.date
+            if message_date is not None:
+                latency_ms = round((datetime.now(timezone.utc) - message_date).total_seconds() * 1000, 1)
+            monitor_log.info(
+                "🎯 编辑后出现新关键词" if edited else "🎯 关键词匹配",
+                extra={
+                    'monitor_id': monitor_id,
+                    'channel': parsed_channel,
+                    'latency_ms': latency_ms,
+                    'sample_key': f"match:{monitor_id}"
+                }
+            )
+            
+            if entry.preview is None:
+                entry.preview = render_preview(message_obj.text)
+            await send_telegram_message(monitor, matched_keyword, entry.preview, build_message_link(message_obj))
+        
         @client.on(events.NewMessage(chats=parsed_channel))
+        @profiler.instrument_handler(monitor_id)
         async def handler(event):
+            if shutting_down:
+                return
             message_obj = event.message
             message_text = message_obj.text
             if not message_text:
                 return
 
-            keywords = config.get('keywords', [])
-            use_regex = config.get('useRegex', False)
+            # 每条消息只读取一次匹配器引用，热更新不会影响正在处理的消息
+            matcher = monitor.matcher
+            seen_matches = monitor.seen_matches
+            if seen_matches is None:
+                entry = check_keyword_match(matcher, message_text)
+            else:
+                # 记录所有匹配的关键词，供编辑后的差异匹配使用
+                entry = check_keyword_match(matcher, message_text, all_keywords=True)
+                seen_matches.put(message_obj.id, entry.keywords)
             
-            # 使用新的关键词匹配函数
-            should_notify = check_keyword_match(message_text, keywords, use_regex)
+            if entry.keyword is not None:
+                await notify_match(message_obj, entry, entry.keyword)
+        
+        @client.on(events.MessageEdited(chats=parsed_channel))
+        @profiler.instrument_handler(monitor_id)
+        async def edit_handler(event):
+            seen_matches = monitor.seen_matches
+            if seen_matches is None or shutting_down:  # 未开启编辑监听或正在关闭
+                return
+            message_obj = event.message
+            message_text = message_obj.text
+            if not message_text:
+                return
+            
+            matcher = monitor.matcher
+            entry = check_keyword_match(matcher, message_text, all_keywords=True)
+            # 未记录过的消息（服务启动前发布或已被淘汰）视为之前没有匹配任何关键词
+            previous = seen_matches.get(message_obj.id, frozenset())
+            seen_matches.put(message_obj.id, entry.keywords)
+            new_keywords = entry.keywords - previous
+            if not new_keywords:
+                return
             
-            if should_notify:
-                print(f"[{monitor_id}] 🎯 关键词匹配")
-                
-                # 构造消息链接
-                if hasattr(channel_entity, 'username') and channel_entity.username:
-                    message_link = f"https://t.me/{channel_entity.username}/{message_obj.id}"
-                else: # 私有频道
-                    message_link = f"https://t.me/c/{channel_entity.id}/{message_obj.id}"
-                
-                await send_telegram_message(config, message_text, message_link)
-        
-        print(f"[{monitor_id}] 🚀 监控启动")
+            # 按关键词列表顺序取第一个新出现的关键词
+            matched_keyword = next((keyword for keyword in matcher.keywords if keyword in new_keywords),
+                                   entry.keyword)
+            await notify_match(message_obj, entry, matched_keyword, edited=True)
+        
+        monitor_log.info("🚀 监控启动", extra={'monitor_id': monitor_id})
+        monitor.status = STATUS_RUNNING
+        if 'ready' in task_ref:
+            task_ref['ready'].set()
         await client.run_until_disconnected()
         
     except asyncio.CancelledError:
-        print(f"[{monitor_id}] 监控取消")
+        monitor_log.info("监控取消", extra={'monitor_id': monitor_id})
         raise
     except Exception as e:
-        print(f"[{monitor_id}] 监控错误: {e}")
-        if monitor_id in active_monitors: del active_monitors[monitor_id]
+        monitor_log.error(f"监控错误: {e}", extra={'monitor_id': monitor_id})
         # 更新状态为错误，保留配置以便重试
-        if monitor_id in monitor_configs:
-            monitor_configs[monitor_id]['status'] = 'error'
+        monitor.client = None
+        monitor.status = STATUS_ERROR
         raise
     finally:
         if client.is_connected(): await client.disconnect()
-        if monitor_id in active_monitors: del active_monitors[monitor_id]
-        # 不删除 monitor_configs，保留配置以便恢复
-        print(f"[{monitor_id}] 监控结束")
+        monitor.client = None
+        # 不删除监控记录，保留配置以便恢复
+        monitor_log.info("监控结束", extra={'monitor_id': monitor_id})
 
-async def stop_monitor_internal(monitor_id: str):
-    if monitor_id in active_monitors:
-        monitor_info = active_monitors.pop(monitor_id)
-        task = monitor_info['task']
+def compute_restart_delay(failures: int, error: Optional[BaseException]) -> float:
+    """带抖动的指数退避；遇到 FloodWait 时至少等待服务器要求的时长"""
+    delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * (2 ** (failures - 1)))
+    delay = delay * random.uniform(0.5, 1.0)
+    if isinstance(error, FloodWaitError):
+        delay = max(delay, float(error.seconds))
+    return delay
+
+async def supervise_monitor(monitor: Monitor, task_ref: dict, fail_fast: bool = True):
+    """
+    监控守护任务：monitor_channel 异常退出或断线后按指数退避自动重启
+    
+    - fail_fast 为 True 时首次启动失败直接抛出，由启动接口返回错误；
+      没有调用方等待结果的后台启动（如配置重载后的重启）首次失败同样按退避重试
+    - 凭证无效、频道不存在等永久性错误不重试
+    - 连续失败达到阈值后熔断，状态置为 error，需手动恢复
+    """
+    monitor_id = monitor.id
+    ready = task_ref.setdefault('ready', asyncio.Event())
+    
+    while True:
+        started_at = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            await monitor_channel(monitor, task_ref)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        
+        # 从未成功运行过：首次启动失败，交给等待结果的调用方处理
+        if fail_fast and not ready.is_set():
+            if error is not None:
+                raise error
+            return
         
-        # 更新状态为停止，但保留配置
-        if monitor_id in monitor_configs:
-            monitor_configs[monitor_id]['status'] = 'stopped'
+        if monitors.get(monitor_id) is not monitor or shutting_down:
+            return  # 监控已被删除或替换，或服务正在关闭
         
+        error_str = str(error) if error is not None else "连接断开"
+        monitor.last_error = error_str
+        if time.monotonic() - started_at >= STABLE_RUN_SECONDS:
+            monitor.failures = 0
+        monitor.failures += 1
+        
+        if any(permanent in error_str for permanent in PERMANENT_ERRORS):
+            monitor.status = STATUS_ERROR
+            monitor.next_retry_at = None
+            monitor_log.error(f"❌ 不可恢复的错误，停止自动重启: {error_str}", extra={'monitor_id': monitor_id})
+            return
+        
+        if monitor.failures >= CIRCUIT_BREAKER_THRESHOLD:
+            monitor.status = STATUS_ERROR
+            monitor.circuit_open = True
+            monitor.next_retry_at = None
+            monitor_log.error(f"❌ 连续失败 {monitor.failures} 次，停止自动重启", extra={'monitor_id': monitor_id})
+            return
+        
+        delay = compute_restart_delay(monitor.failures, error)
+        monitor.status = STATUS_RETRYING
+        monitor.next_retry_at = time.time() + delay
+        monitor_log.info(f"🔄 {delay:.1f} 秒后自动重启（第 {monitor.failures} 次连续失败）", extra={'monitor_id': monitor_id})
+        
+        await asyncio.sleep(delay)
+        monitor.next_retry_at = None
+        monitor.restarts += 1
+        monitor.status = STATUS_STARTING
+
+def launch_monitor(monitor: Monitor, fail_fast: bool = True) -> tuple[asyncio.Task, dict]:
+    """
+    创建监控守护任务并记录到监控中
+    
+    Args:
+        fail_fast: 首次启动失败时是否直接结束任务（调用方等待并返回错误）；
+            为 False 时首次失败也按退避重试
+    """
+    monitor.reset_supervisor()
+    task_ref = {'ready': asyncio.Event()}
+    monitor.task = asyncio.create_task(supervise_monitor(monitor, task_ref, fail_fast))
+    return monitor.task, task_ref
+
+async def wait_monitor_ready(task: asyncio.Task, task_ref: dict, timeout: float = MONITOR_START_TIMEOUT):
+    """等待监控就绪、启动失败或超时，以先发生者为准"""
+    ready_wait = asyncio.create_task(task_ref['ready'].wait())
+    try:
+        await asyncio.wait({task, ready_wait}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        ready_wait.cancel()
+
+async def stop_monitor_internal(monitor_id: str):
+    monitor = monitors.get(monitor_id)
+    if monitor is None:
+        return False, f"未找到监控 {monitor_id}"
+    
+    # 更新状态为停止，但保留配置
+    monitor.status = STATUS_STOPPED
+    monitor.next_retry_at = None
+    
+    # 运行中或正在等待自动重启的监控都需要取消守护任务
+    task = monitor.task
+    if task is not None and not task.done():
         task.cancel()
         
         try:
             await task
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, Exception):
             pass # 任务取消是预期的
+    
+    monitor_log.info("监控已停止", extra={'monitor_id': monitor_id})
+    return True, f"监控 {monitor_id} 已停止"
 
-        print(f"[{monitor_id}] 监控已停止")
-        return True, f"监控 {monitor_id} 已停止"
-    elif monitor_id in monitor_configs:
-        # 监控已经停止但配置还在
-        monitor_configs[monitor_id]['status'] = 'stopped'
-        print(f"[{monitor_id}] 监控已停止")
-        return True, f"监控 {monitor_id} 已停止"
-    else:
-        return False, f"未找到监控 {monitor_id}"
+async def restart_monitor_internal(monitor_id: str):
+    """使用已保存的配置重启监控（重新创建客户端）"""
+    monitor = monitors.get(monitor_id)
+    if monitor is None:
+        return
+    await stop_monitor_internal(monitor_id)
+    monitor.status = STATUS_STARTING
+    # 没有调用方等待结果，重连失败（如代理短暂不可用）按退避重试而不是直接进入 error
+    launch_monitor(monitor, fail_fast=False)
+
+# --- 配置热重载 ---
+async def reload_server_config(reason: str) -> tuple[bool, List[str], List[str]]:
+    """
+    重新加载配置文件并只重启受影响的子系统：
+    - bot: 通知路径每条消息读取快照，无需重启
+    - telegram/proxy: 客户端创建时固定了凭证和代理，需要重启运行中的监控
+    - server: 监听地址等需要重启进程才能生效
+    """
+    success, changed, errors = server_config.reload()
+    if not success:
+        config_log.error(f"❌ 配置重载失败（{reason}），继续使用旧配置: {'; '.join(errors)}")
+        return success, changed, errors
+    
+    if not changed:
+        config_log.info(f"🔄 配置已重载（{reason}），无变更")
+        return success, changed, errors
+    
+    config_log.info(f"🔄 配置已重载（{reason}），变更: {', '.join(changed)}")
+    
+    if 'logging' in changed:
+        # 日志管道已初始化，再次调用只更新级别、采样参数和输出格式
+        logging_config = server_config.snapshot.logging
+        setup_logging(
+            level=logging_config.level,
+            levels=logging_config.levels,
+            fmt=logging_config.format,
+            sample_interval=logging_config.sample_interval,
+            sample_burst=logging_config.sample_burst
+        )
+    
+    if 'proxy' in changed:
+        # 代理变更后连接检查结果失效
+        connectivity_state['checked_at'] = None
+    
+    if 'telegram' in changed or 'proxy' in changed:
+        running_ids = [monitor.id for monitor in monitors.values() if monitor.is_connected]
+        if running_ids:
+            config_log.info(f"🔄 重启 {len(running_ids)} 个运行中的监控以应用新的连接配置")
+            await asyncio.gather(*(restart_monitor_internal(monitor_id) for monitor_id in running_ids))
+    
+    if 'server' in changed:
+        config_log.warning("⚠️  server 配置变更需要重启服务后生效")
+    
+    return success, changed, errors
+
+async def watch_config_file():
+    """定期检查配置文件修改时间，变更时自动重载"""
+    while True:
+        await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+        try:
+            if server_config.file_changed():
+                await reload_server_config("文件变更")
+        except Exception as e:
+            config_log.error(f"配置文件监视错误: {e}")
+
+# --- 性能分析 ---
+# 计时的处理阶段（模块全局函数名）及开启性能分析前的原函数
+PROFILED_STAGES = ('check_keyword_match', 'escape_html', 'send_telegram_message')
+_unprofiled_stages: Dict[str, Callable] = {}
+
+def enable_profiling():
+    """
+    开启性能分析：启动事件循环延迟监控，并为各处理阶段替换为计时版本
+    （调用方通过模块全局名称调用这些函数，未开启时没有任何包装）
+    
+    重复调用不会重复包装
+    """
+    profiler.enable()
+    if not _unprofiled_stages:
+        module_globals = globals()
+        for stage in PROFILED_STAGES:
+            _unprofiled_stages[stage] = module_globals[stage]
+            module_globals[stage] = profiler.timed(stage, module_globals[stage])
+    server_log.info("🔬 性能分析已开启")
+
+def disable_profiling():
+    """关闭性能分析并恢复各处理阶段的原函数"""
+    profiler.disable()
+    globals().update(_unprofiled_stages)
+    _unprofiled_stages.clear()
 
 # --- API 端点 ---
 @app.post("/monitor/start")
 async def start_monitor_endpoint(config: MonitorConfig):
     monitor_id = config.id
     
+    if shutting_down:
+        raise HTTPException(status_code=503, detail="服务正在关闭")
+    
     # 检查服务器配置
     if not server_config.telegram.validate():
         raise HTTPException(
@@ -482,23 +776,34 @@ async def start_monitor_endpoint(config: MonitorConfig):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"频道标识符错误: {str(e)}")
     
-    if monitor_id in active_monitors:
+    try:
+        validate_chat_ids(config.chatIds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    old_monitor = monitors.get(monitor_id)
+    if old_monitor is not None:
         await stop_monitor_internal(monitor_id)
+        old_monitor.release()
         await asyncio.sleep(1)
-
-    task_ref = {}
     
-    # 保存配置信息用于状态查询，使用新的状态管理机制
-    config_dict = config.model_dump()
-    monitor_configs[monitor_id] = {
-        'config': config_dict,
-        'status': 'starting'  # 初始状态
-    }
+    # 创建监控记录（初始状态为 starting），关键词集合相同的监控共享匹配器
+    monitor = Monitor(
+        monitor_id,
+        config.channel,
+        config.keywords,
+        config.useRegex,
+        chat_ids=config.chatIds,
+        priority=config.priority,
+        watch_edits=config.watchEdits
+    )
+    monitors[monitor_id] = monitor
+    checkpoint_writer.schedule()
     
     try:
-        task = asyncio.create_task(monitor_channel(config.model_dump(), task_ref))
-        # 给任务更多时间初始化
-        await asyncio.sleep(2.0)
+        task, task_ref = launch_monitor(monitor)
+        # 等待监控就绪，最多 MONITOR_START_TIMEOUT 秒
+        await wait_monitor_ready(task, task_ref)
         
         if task.done():
             try: 
@@ -513,16 +818,14 @@ async def start_monitor_endpoint(config: MonitorConfig):
                     error_msg = "手机号无效"
                 raise HTTPException(status_code=500, detail=f"监控启动失败: {error_msg}")
         
-        if monitor_id not in active_monitors:
+        if not monitor.is_connected:
             task.cancel()
             # 更新状态为错误
-            if monitor_id in monitor_configs:
-                monitor_configs[monitor_id]['status'] = 'error'
+            monitor.status = STATUS_ERROR
             raise HTTPException(status_code=500, detail="监控注册失败")
             
         # 更新状态为运行中
-        if monitor_id in monitor_configs:
-            monitor_configs[monitor_id]['status'] = 'running'
+        monitor.status = STATUS_RUNNING
             
         return {"message": f"监控 {monitor_id} 已成功启动"}
         
@@ -535,33 +838,66 @@ async def start_monitor_endpoint(config: MonitorConfig):
 async def stop_monitor_endpoint(body: StopRequestBody):
     monitor_id = body.id
     success, message = await stop_monitor_internal(monitor_id)
-    if success: return {"message": message}
+    if success:
+        checkpoint_writer.schedule()
+        return {"message": message}
     else: raise HTTPException(status_code=404, detail=message)
 
+@app.patch("/monitor/{monitor_id}")
+async def update_monitor_endpoint(monitor_id: str, body: MonitorUpdateBody):
+    """热更新监控的关键词、匹配选项和通知选项，保持订阅连接不中断"""
+    monitor = monitors.get(monitor_id)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail=f"未找到监控 {monitor_id}")
+    
+    try:
+        validate_chat_ids(body.chatIds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    keywords = body.keywords if body.keywords is not None else monitor.keywords
+    use_regex = body.useRegex if body.useRegex is not None else monitor.use_regex
+    
+    # 先获取完整的新匹配器，再一次性替换引用，下一条消息即生效
+    monitor.set_keywords(keywords, use_regex)
+    if body.chatIds is not None:
+        monitor.chat_ids = intern_strings(body.chatIds) or None
+    if body.priority is not None:
+        monitor.priority = sys.intern(body.priority)
+    if body.watchEdits is not None:
+        monitor.set_watch_edits(body.watchEdits)
+    
+    checkpoint_writer.schedule()
+    monitor_log.info("配置已热更新", extra={'monitor_id': monitor_id})
+    return {
+        "message": f"监控 {monitor_id} 已更新",
+        "keywords": list(monitor.keywords),
+        "useRegex": monitor.use_regex,
+        "chatIds": list(monitor.chat_ids) if monitor.chat_ids else None,
+        "priority": monitor.priority,
+        "watchEdits": monitor.watch_edits
+    }
+
 @app.post("/monitor/resume")
 async def resume_monitor_endpoint(body: StopRequestBody):
     """恢复已停止的监控任务"""
     monitor_id = body.id
     
+    if shutting_down:
+        raise HTTPException(status_code=503, detail="服务正在关闭")
+    
     # 检查是否存在已停止的监控配置
-    if monitor_id not in monitor_configs:
+    monitor = monitors.get(monitor_id)
+    if monitor is None:
         raise HTTPException(status_code=404, detail=f"未找到监控 {monitor_id} 的配置")
     
-    monitor_data = monitor_configs[monitor_id]
-    current_status = monitor_data.get('status', 'unknown')
-    
     # 检查状态
-    if current_status == 'running':
+    if monitor.status == STATUS_RUNNING:
         raise HTTPException(status_code=400, detail=f"监控 {monitor_id} 已经在运行中")
     
-    if monitor_id in active_monitors:
+    if monitor.is_connected:
         raise HTTPException(status_code=400, detail=f"监控 {monitor_id} 已经在运行中")
     
-    # 获取原始配置
-    config_dict = monitor_data.get('config', {})
-    if not config_dict:
-        raise HTTPException(status_code=400, detail=f"监控 {monitor_id} 的配置为空")
-    
     # 重用启动监控的逻辑
     try:
         # 检查服务器配置
@@ -579,18 +915,27 @@ async def resume_monitor_endpoint(body: StopRequestBody):
         
         # 验证输入参数
         try:
-            parsed_channel = parse_channel_identifier(config_dict.get('channel', ''))
+            parsed_channel = parse_channel_identifier(monitor.channel)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"频道标识符错误: {str(e)}")
         
+        # 正在等待自动重启的监控直接取消等待，立即恢复
+        pending_task = monitor.task
+        if pending_task is not None and not pending_task.done():
+            pending_task.cancel()
+            try:
+                await pending_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        
         # 更新状态为启动中
-        monitor_configs[monitor_id]['status'] = 'starting'
+        monitor.status = STATUS_STARTING
+        checkpoint_writer.schedule()
         
-        task_ref = {}
-        task = asyncio.create_task(monitor_channel(config_dict, task_ref))
+        task, task_ref = launch_monitor(monitor)
         
-        # 给任务更多时间初始化
-        await asyncio.sleep(2.0)
+        # 等待监控就绪，最多 MONITOR_START_TIMEOUT 秒
+        await wait_monitor_ready(task, task_ref)
         
         if task.done():
             try: 
@@ -598,22 +943,22 @@ async def resume_monitor_endpoint(body: StopRequestBody):
             except Exception as e: 
                 error_msg = str(e)
                 if "Could not find the input entity" in error_msg:
-                    error_msg = f"无法找到频道 '{config_dict.get('channel', '')}'"
+                    error_msg = f"无法找到频道 '{monitor.channel}'"
                 elif "AUTH_KEY_UNREGISTERED" in error_msg:
                     error_msg = "账户未注册，请检查服务器配置"
                 elif "PHONE_NUMBER_INVALID" in error_msg:
                     error_msg = "手机号无效"
                 # 更新状态为错误
-                monitor_configs[monitor_id]['status'] = 'error'
+                monitor.status = STATUS_ERROR
                 raise HTTPException(status_code=500, detail=f"监控恢复失败: {error_msg}")
         
-        if monitor_id not in active_monitors:
+        if not monitor.is_connected:
             task.cancel()
-            monitor_configs[monitor_id]['status'] = 'error'
+            monitor.status = STATUS_ERROR
             raise HTTPException(status_code=500, detail="监控注册失败")
             
         # 更新状态为运行中
-        monitor_configs[monitor_id]['status'] = 'running'
+        monitor.status = STATUS_RUNNING
             
         return {"message": f"监控 {monitor_id} 已成功恢复"}
         
@@ -621,8 +966,7 @@ async def resume_monitor_endpoint(body: StopRequestBody):
         raise
     except Exception as e:
         # 更新状态为错误
-        if monitor_id in monitor_configs:
-            monitor_configs[monitor_id]['status'] = 'error'
+        monitor.status = STATUS_ERROR
         raise HTTPException(status_code=500, detail=f"内部错误: {str(e)}")
 
 @app.post("/monitor/delete")
@@ -630,24 +974,17 @@ async def delete_monitor_endpoint(body: StopRequestBody):
     """彻底删除监控任务和配置"""
     monitor_id = body.id
     
-    # 先停止监控（如果正在运行）
-    if monitor_id in active_monitors:
-        monitor_info = active_monitors.pop(monitor_id)
-        task = monitor_info['task']
-        
-        task.cancel()
-        
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass  # 任务取消是预期的
-        
-        print(f"[{monitor_id}] 监控已停止")
+    # 先停止监控（如果正在运行或等待自动重启）
+    if monitor_id in monitors:
+        await stop_monitor_internal(monitor_id)
     
     # 删除配置
-    if monitor_id in monitor_configs:
-        del monitor_configs[monitor_id]
-        print(f"[{monitor_id}] 配置已删除")
+    monitor = monitors.pop(monitor_id, None)
+    if monitor is not None:
+        monitor.release()
+        profiler.forget_monitor(monitor_id)
+        checkpoint_writer.schedule()
+        monitor_log.info("配置已删除", extra={'monitor_id': monitor_id})
         return {"message": f"监控 {monitor_id} 已彻底删除"}
     else:
         raise HTTPException(status_code=404, detail=f"未找到监控 {monitor_id}")
@@ -659,33 +996,20 @@ async def get_status():
     active_list = []  # 保持向后兼容
     
     # 遍历所有配置（包括已停止的）
-    for monitor_id, monitor_data in monitor_configs.items():
-        config = monitor_data.get('config', {})
-        status = monitor_data.get('status', 'unknown')
-        
-        # 解析频道名称，去除 @ 前缀用于展示
-        channel_display = config.get('channel', '')
-        if channel_display.startswith('@'):
-            channel_display = channel_display[1:]
-        
-        monitor_info = {
-            "id": monitor_id,
-            "channel": channel_display,
-            "channelTitle": config.get('channelTitle', channel_display), 
-            "keywords": config.get('keywords', []),
-            "useRegex": config.get('useRegex', False),
-            "status": status
-        }
-        monitor_list.append(monitor_info)
+    for monitor in monitors.values():
+        monitor_list.append(monitor.to_status())
         
         # 保持向后兼容：只有运行中的监控才加入 active_monitors
-        if status == 'running':
-            active_list.append(monitor_id)
+        if monitor.status == STATUS_RUNNING:
+            active_list.append(monitor.id)
     
-    return {
+    # 内容均为 JSON 原生类型，直接返回 JSONResponse，跳过 FastAPI 对每个字段的逐层 jsonable_encoder 转换
+    return JSONResponse(content={
         "active_monitors": active_list,  # 保持向后兼容
-        "monitors": monitor_list  # 新的详细信息（包括所有状态）
-    }
+        "monitors": monitor_list,  # 新的详细信息（包括所有状态）
+        "notifications": notification_dispatcher.stats(),  # 各优先级的通知发送统计
+        "matchCache": match_cache.stats()  # 消息匹配缓存统计
+    })
 
 @app.get("/config/check")
 async def check_server_config():
@@ -701,22 +1025,214 @@ async def check_server_config():
         "bot_message": f"已配置 {len(server_config.chat_ids)} 个通知目标" if bot_valid else "请检查 config.py 中的 Bot Token/Chat IDs"
     }
 
-# --- 启动事件处理 ---
-@app.on_event("startup")
+@app.get("/health")
+async def health_check():
+    """服务就绪状态及 Telegram 连接延迟（结果带缓存）"""
+    snapshot = server_config.snapshot
+    config_valid = snapshot.telegram_valid and snapshot.bot_valid
+    state = await check_telegram_connectivity()
+    checked_at = state['checked_at']
+    ready = bool(config_valid and state['ok'])
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "config_valid": config_valid,
+            "telegram_reachable": state['ok'],
+            "mode": state['mode'],
+            "latencies_ms": state['latencies_ms'],
+            "checked_seconds_ago": round(time.monotonic() - checked_at, 1) if checked_at is not None else None,
+            "running_monitors": sum(1 for monitor in monitors.values() if monitor.is_connected)
+        }
+    )
+
+@app.post("/config/reload")
+async def reload_config_endpoint():
+    """手动触发配置重载"""
+    success, changed, errors = await reload_server_config("手动触发")
+    if not success:
+        raise HTTPException(status_code=400, detail=f"配置重载失败: {'; '.join(errors)}")
+    return {"message": "配置已重载", "changed": changed}
+
+@app.get("/admin/metrics")
+async def admin_metrics():
+    """性能分析统计：事件循环延迟、各阶段耗时、各监控累计 CPU 时间"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="性能分析未开启，请在配置中设置 server.profiling: true")
+    return profiler.stats()
+
+@app.get("/admin/profile")
+async def admin_profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """对事件循环线程做限时采样，返回 collapsed stack 格式的文件（可用于生成火焰图）"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="性能分析未开启，请在配置中设置 server.profiling: true")
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"采样时长必须在 0 到 {PROFILE_MAX_SECONDS:g} 秒之间")
+    
+    try:
+        collapsed = await profiler.sample(seconds, max(PROFILE_MIN_INTERVAL, interval_ms / 1000))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return PlainTextResponse(
+        collapsed,
+        headers={'Content-Disposition': 'attachment; filename="telemon-profile.collapsed"'}
+    )
+
+# --- 启动与关闭 ---
+def restore_monitors() -> List[Monitor]:
+    """
+    从检查点恢复监控记录（在开始处理请求前同步执行）
+    
+    需要重新运行的监控先标记为启动中，即使在后台启动前就开始关闭，
+    下一次保存的检查点仍会记录它们需要运行
+    
+    Returns:
+        List[Monitor]: 关闭前未被手动停止、需要重新启动的监控
+    """
+    try:
+        records = load_checkpoint(MONITOR_CHECKPOINT_FILE)
+    except Exception as e:
+        server_log.error(f"❌ 读取监控检查点失败: {e}")
+        return []
+    
+    to_start = []
+    for record in records:
+        try:
+            monitor = Monitor.from_checkpoint(record)
+        except Exception as e:
+            server_log.error(f"❌ 监控检查点记录无效: {e}")
+            continue
+        if monitor.id in monitors:
+            monitor.release()
+            continue
+        monitors[monitor.id] = monitor
+        if record.get('running'):
+            monitor.status = STATUS_STARTING
+            to_start.append(monitor)
+    
+    if records:
+        server_log.info(f"📂 已从检查点恢复 {len(records)} 个监控，其中 {len(to_start)} 个重新启动")
+    return to_start
+
+async def launch_restored_monitors(to_start: List[Monitor]):
+    """
+    在后台逐个启动恢复的监控
+    
+    没有调用方等待结果，首次连接失败（如启动时网络短暂不可用）也按退避规则重试；
+    每启动一个让出一次事件循环，关闭开始后不再启动
+    """
+    for monitor in to_start:
+        if shutting_down:
+            return
+        # 期间已被删除、手动停止，或已通过接口恢复
+        if monitors.get(monitor.id) is not monitor or monitor.status != STATUS_STARTING or monitor.task is not None:
+            continue
+        launch_monitor(monitor, fail_fast=False)
+        await asyncio.sleep(0)
+
 async def startup_event():
     """服务启动时执行的检查"""
-    print("\n🚀 Telemon Backend 启动中...")
+    global _config_watch_task, _session_flush_task, _restore_task, session_backend
+    server_log.info("🚀 Telemon Backend 启动中...")
     
     # 检查服务器配置
     if not server_config.telegram.validate():
-        print("❌ Telegram API 配置不完整，请运行: python setup.py")
+        server_log.error("❌ Telegram API 配置不完整，请运行: python setup.py")
         sys.exit(1)
     
     if not server_config.validate_bot():
-        print("❌ Bot 配置不完整，请运行: python setup.py")
+        server_log.error("❌ Bot 配置不完整，请运行: python setup.py")
+        sys.exit(1)
+    
+    # 与热重载相同的服务器配置校验，避免拼写错误的会话后端被静默当作 sqlite
+    if not server_config.snapshot.server_valid:
+        server_log.error(f"❌ 不支持的会话后端: {server_config.server.session_backend}（可选 sqlite / memory）")
         sys.exit(1)
     
-    # 执行网络连接检查
-    await check_telegram_connectivity()
+    # 网络连接检查在后台并发执行，不阻塞服务启动
+    asyncio.create_task(report_startup_connectivity())
+    
+    # 启动通知分发器
+    await notification_dispatcher.start()
+    
+    # 内存会话后端：定期将有变更的会话快照写入磁盘
+    server_settings = server_config.snapshot.server
+    session_backend = server_settings.session_backend
+    if session_backend == SESSION_BACKEND_MEMORY:
+        _session_flush_task = asyncio.create_task(session_flusher.run(server_settings.session_flush_interval))
+    
+    # 性能分析需在恢复监控前开启，以便包装恢复的监控的消息处理函数
+    if server_settings.profiling:
+        enable_profiling()
+    
+    # 恢复上次关闭时的监控，在后台逐个启动
+    _restore_task = asyncio.create_task(launch_restored_monitors(restore_monitors()))
+    
+    # 配置热重载：文件变更自动重载，也可通过 SIGHUP 触发
+    _config_watch_task = asyncio.create_task(watch_config_file())
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(
+            signal.SIGHUP,
+            lambda: asyncio.create_task(reload_server_config("SIGHUP"))
+        )
+    except (NotImplementedError, AttributeError):
+        pass  # Windows 不支持 SIGHUP
+    
+    server_log.info("✅ 服务启动成功！现在可以使用监控功能。")
+
+async def disconnect_all_monitors():
+    """并发取消所有监控守护任务，各任务在 finally 中断开各自的客户端"""
+    tasks = [monitor.task for monitor in monitors.values() if monitor.task is not None and not monitor.task.done()]
+    for task in tasks:
+        task.cancel()
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_DISCONNECT_TIMEOUT)
+    if pending:
+        server_log.warning(f"⚠️  {len(pending)} 个监控未能在 {SHUTDOWN_DISCONNECT_TIMEOUT} 秒内断开连接")
+
+async def drain_notifications():
+    """在截止时间内发送完已入队的通知，然后关闭分发器"""
+    remaining = await notification_dispatcher.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    if remaining:
+        server_log.warning(f"⚠️  关闭时仍有 {remaining} 条通知未发送")
+    await notification_dispatcher.stop()
+
+async def shutdown_event():
+    """
+    优雅关闭：
+    1. 停止处理新消息、不再启动或自动重启监控
+    2. 保存监控检查点（下次启动时恢复未被手动停止的监控）
+    3. 并发执行：发送完通知队列（有截止时间）、断开所有客户端
+    4. 停止日志后台线程
+    """
+    global shutting_down
+    shutting_down = True
+    started_at = time.monotonic()
+    server_log.info("🛑 Telemon Backend 正在关闭...")
+    
+    for task in (_restore_task, _config_watch_task, _session_flush_task):
+        if task is not None:
+            task.cancel()
+    disable_profiling()
+    try:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    except (NotImplementedError, AttributeError):
+        pass
+    
+    # 在取消任务前保存，此时监控状态仍是关闭前的状态；先等待后台写入完成，避免旧内容覆盖最终检查点
+    await checkpoint_writer.wait()
+    try:
+        save_checkpoint(MONITOR_CHECKPOINT_FILE, monitors.values())
+    except Exception as e:
+        server_log.error(f"❌ 保存监控检查点失败: {e}")
+    
+    await asyncio.gather(drain_notifications(), disconnect_all_monitors())
+    # 所有客户端断开后，在线程池中写出有变更的会话快照（包括断开时关闭的会话）
+    await session_flusher.flush_all()
     
-    print("✅ 服务启动成功！现在可以使用监控功能。\n")
\ No newline at end of file
+    server_log.info(f"✅ 服务已关闭，耗时 {time.monotonic() - started_at:.1f} 秒")
+    shutdown_logging()
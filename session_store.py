@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Telegram 会话存储模块
+可选的内存会话后端：会话状态保存在内存中，由后台任务定期将快照原子写入磁盘（先写临时文件再重命名），
+消息处理路径上不再有 SQLite 写入，多个监控共用默认会话时也不会争用同一个数据库锁
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, StringSession
+from telethon.tl import types
+
+from logger import get_logger
+
+log = get_logger("session")
+
+# 会话后端
+SESSION_BACKEND_SQLITE = 'sqlite'
+SESSION_BACKEND_MEMORY = 'memory'
+SESSION_BACKENDS = (SESSION_BACKEND_SQLITE, SESSION_BACKEND_MEMORY)
+
+SESSION_STRING_ENV = 'TELEGRAM_SESSION_STRING'  # 通过环境变量提供的 StringSession 字符串
+SNAPSHOT_SUFFIX = '.session.json'               # 内存会话快照文件后缀
+SQLITE_SUFFIX = '.session'                      # Telethon 默认的 SQLite 会话文件后缀
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotSession(MemorySession):
+    """
+    定期落盘的内存会话
+
+    所有读写都在内存中完成，Telethon 调用 save() 时只标记为有变更；
+    由 SessionFlusher 定期在线程池中写出快照。客户端断开（close）时不在事件循环上写盘，
+    只交给 SessionFlusher 保留到下一次写出（服务关闭时也会写出一次）。
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path      # 快照文件路径
+        self.source = None    # 会话的加载来源，用于日志
+        self._dirty = False
+
+    # --- 加载 ---
+    def load_snapshot(self, path: str):
+        """从快照文件加载"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._dc_id = data.get('dcId') or 0
+        self._server_address = data.get('serverAddress')
+        self._port = data.get('port')
+        if data.get('authKey'):
+            self._auth_key = AuthKey(base64.b64decode(data['authKey']))
+        self._takeout_id = data.get('takeoutId')
+        self._entities = {tuple(row) for row in data.get('entities', [])}
+        self._update_states = {
+            int(entity_id): types.updates.State(pts, qts, _from_timestamp(date), seq, unread_count=0)
+            for entity_id, (pts, qts, date, seq) in data.get('updateStates', {}).items()
+        }
+        self.source = path
+        self._dirty = path != self.path  # 从其他会话的快照导入时，写出一份自己的快照
+
+    def load_string(self, string: str):
+        """从 StringSession 字符串加载（只包含数据中心和授权密钥）"""
+        string_session = StringSession(string)
+        self._dc_id = string_session.dc_id
+        self._server_address = string_session.server_address
+        self._port = string_session.port
+        self._auth_key = string_session.auth_key
+        self.source = 'string'
+        self._dirty = True
+
+    def load_sqlite(self, path: str):
+        """从已有的 SQLite 会话文件导入（只读，不修改原文件）"""
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = connection.execute('select dc_id, server_address, port, auth_key, takeout_id from sessions').fetchone()
+            if row:
+                self._dc_id, self._server_address, self._port, auth_key, self._takeout_id = row
+                if auth_key:
+                    self._auth_key = AuthKey(auth_key)
+            self._entities = {
+                tuple(row) for row in connection.execute('select id, hash, username, phone, name from entities')
+            }
+            for entity_id, pts, qts, date, seq in connection.execute('select id, pts, qts, date, seq from update_state'):
+                self._update_states[entity_id] = types.updates.State(pts, qts, _from_timestamp(date), seq, unread_count=0)
+        finally:
+            connection.close()
+        self.source = path
+        self._dirty = True
+
+    # --- 变更标记 ---
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._dirty = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty = True
+
+    def process_entities(self, tlo):
+        count = len(self._entities)
+        super().process_entities(tlo)
+        if len(self._entities) != count:
+            self._dirty = True
+
+    def save(self):
+        # Telethon 在连接、切换数据中心和处理更新后调用，这里不做磁盘写入
+        pass
+
+    def close(self):
+        # Telethon 在断开连接时于事件循环中调用；关闭时大量客户端同时断开，这里不做同步写盘
+        session_flusher.hold(self)
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    # --- 落盘 ---
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def snapshot(self) -> Dict[str, Any]:
+        """生成当前状态的快照（在事件循环线程中调用，返回的数据与会话不再共享）"""
+        return {
+            'version': SNAPSHOT_VERSION,
+            'dcId': self._dc_id,
+            'serverAddress': self._server_address,
+            'port': self._port,
+            'authKey': base64.b64encode(self._auth_key.key).decode('ascii') if self._auth_key else None,
+            'takeoutId': self._takeout_id,
+            'entities': [list(row) for row in self._entities],
+            'updateStates': {
+                str(entity_id): [state.pts, state.qts, _to_timestamp(state.date), state.seq]
+                for entity_id, state in self._update_states.items()
+            },
+        }
+
+    async def flush_async(self):
+        """如有变更，在事件循环线程中生成快照，在线程池中写入磁盘"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        data = self.snapshot()
+        try:
+            await asyncio.to_thread(write_snapshot, self.path, data)
+        except Exception:
+            self._dirty = True  # 下次重试
+            raise
+
+
+def _from_timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc) if isinstance(value, (int, float)) else value
+
+
+def _to_timestamp(value) -> Optional[float]:
+    return value.timestamp() if hasattr(value, 'timestamp') else value
+
+
+def write_snapshot(path: str, data: Dict[str, Any]):
+    """原子写入快照：在同一目录写入唯一的临时文件，fsync 后重命名覆盖"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o600)  # 快照包含授权密钥
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def open_memory_session(session_dir: str, name: str) -> SnapshotSession:
+    """
+    创建内存会话，按以下顺序加载已有状态：
+    1. 该监控专属的快照或 SQLite 会话文件
+    2. 环境变量 TELEGRAM_SESSION_STRING
+    3. 默认（default）的快照或 SQLite 会话文件
+    都不存在时返回空会话（首次登录）
+
+    无论从哪里加载，快照都写入该监控专属的 `<name>.session.json`：从共享来源导入的监控
+    下次启动时直接读取自己的快照（保留实体缓存和更新状态），多个监控也不会互相覆盖同一个文件
+    """
+    snapshot_path = os.path.join(session_dir, f"{name}{SNAPSHOT_SUFFIX}")
+    session = SnapshotSession(snapshot_path)
+
+    def load(session_name: str) -> bool:
+        source_snapshot = os.path.join(session_dir, f"{session_name}{SNAPSHOT_SUFFIX}")
+        sqlite_path = os.path.join(session_dir, f"{session_name}{SQLITE_SUFFIX}")
+        if os.path.exists(source_snapshot):
+            session.load_snapshot(source_snapshot)
+            return True
+        if os.path.exists(sqlite_path):
+            session.load_sqlite(sqlite_path)
+            return True
+        return False
+
+    if not load(name):
+        string = os.getenv(SESSION_STRING_ENV)
+        if string:
+            session.load_string(string)
+        elif name != 'default':
+            load('default')
+
+    session_flusher.register(session)
+    return session
+
+
+class SessionFlusher:
+    """定期将有变更的内存会话写入磁盘"""
+
+    def __init__(self):
+        self._sessions: "weakref.WeakSet[SnapshotSession]" = weakref.WeakSet()
+        # 已关闭但尚未写出的会话：客户端释放后会话仍需保留到下一次写出
+        self._closed: set = set()
+
+    def register(self, session: SnapshotSession):
+        self._sessions.add(session)
+
+    def hold(self, session: SnapshotSession):
+        """会话关闭时调用，有变更时保留强引用直到下一次 flush_all 写出"""
+        if session.dirty:
+            self._closed.add(session)
+
+    async def flush_all(self):
+        """写出所有有变更的会话（在线程池中写盘）"""
+        closed, self._closed = self._closed, set()
+        for session in set(self._sessions) | closed:
+            try:
+                await session.flush_async()
+            except Exception as e:
+                log.error(f"会话快照写入失败: {session.path}: {e}")
+                if session in closed:
+                    self._closed.add(session)  # 下次重试
+
+    async def run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_all()
+
+
+# 全局会话落盘任务
+session_flusher = SessionFlusher()